@@ -17,9 +17,15 @@ class Settings:
         "GEMINI_API_BASE",
         "https://generativelanguage.googleapis.com/v1beta/models",
     )
+    # Per-attempt timeout (seconds) and extra attempts on timeouts, 429 and 5xx
+    gemini_request_timeout: float = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "90"))
+    gemini_max_retries: int = int(os.getenv("GEMINI_MAX_RETRIES", "1"))
+    # Longest wait (seconds) for Batch Mode jobs before falling back to heuristics
+    gemini_batch_max_wait: float = float(os.getenv("GEMINI_BATCH_MAX_WAIT", "86400"))
     landing_api_key: str | None = os.getenv("LANDINGAI_API_KEY")
     landing_parse_model: str = os.getenv("LANDINGAI_PARSE_MODEL", "")
     landing_api_base: str = os.getenv("LANDINGAI_API_BASE", "https://api.va.landing.ai")
+    landing_request_timeout: float = float(os.getenv("LANDINGAI_REQUEST_TIMEOUT", "180"))
 
     # Firebase
     firebase_credentials_path: str = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-admin-key.json")
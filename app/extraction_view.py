@@ -0,0 +1,71 @@
+"""Typed view over an extraction JSON for Sidiya.
+
+Walks the nested extraction sections once, tolerating missing, null or
+mistyped sections, so the summary, storage and reminder code read plain
+attributes instead of repeating guarded ``.get`` chains.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+
+def _as_dict(value: Any) -> dict[str, Any]:
+    return value if isinstance(value, dict) else {}
+
+
+def _as_list(value: Any) -> list[Any]:
+    return value if isinstance(value, list) else []
+
+
+@dataclass(slots=True)
+class ExtractionView:
+    raw: dict[str, Any]
+    patient: dict[str, Any]
+    encounter: dict[str, Any]
+    clinical: dict[str, Any]
+    source_document: dict[str, Any]
+    medications: dict[str, Any]
+    meds: list[Any]
+    appointments: list[Any]
+    first_appointment: dict[str, Any]
+    discharge_advice: dict[str, Any]
+    monitoring: dict[str, Any]
+    congestion: dict[str, Any]
+    red_flags: dict[str, Any]
+    care_plan: dict[str, Any]
+    care_start: str | None
+    care_end: str | None
+
+    @classmethod
+    def from_dict(cls, extracted: dict[str, Any]) -> ExtractionView:
+        appointments = _as_list(_as_dict(extracted.get("follow_up")).get("appointments"))
+        chf = _as_dict(_as_dict(extracted.get("clinical_modules")).get("chf"))
+        medications = _as_dict(extracted.get("medications"))
+        care_plan = _as_dict(extracted.get("care_plan_90d"))
+        return cls(
+            raw=extracted,
+            patient=_as_dict(extracted.get("patient")),
+            encounter=_as_dict(extracted.get("encounter")),
+            clinical=_as_dict(extracted.get("clinical_episode")),
+            source_document=_as_dict(extracted.get("source_document")),
+            medications=medications,
+            meds=_as_list(medications.get("discharge_medications")),
+            appointments=appointments,
+            first_appointment=_as_dict(appointments[0]) if appointments else {},
+            discharge_advice=_as_dict(_as_dict(extracted.get("extracted_details")).get("discharge_advice")),
+            monitoring=_as_dict(chf.get("monitoring")),
+            congestion=_as_dict(chf.get("congestion_status")),
+            red_flags=_as_dict(chf.get("red_flags")),
+            care_plan=care_plan,
+            care_start=care_plan.get("start_date"),
+            care_end=care_plan.get("end_date"),
+        )
+
+
+def as_view(extraction: dict[str, Any] | ExtractionView) -> ExtractionView:
+    """Return ``extraction`` as a view, building one from a raw dict."""
+    if isinstance(extraction, ExtractionView):
+        return extraction
+    return ExtractionView.from_dict(extraction)
@@ -15,11 +15,15 @@ from firebase_admin import credentials, firestore
 from google.cloud.firestore_v1 import FieldFilter
 
 from app.config import settings
+from app.extraction_view import ExtractionView, as_view
 
 logger = logging.getLogger(__name__)
 
 _db = None
 
+# Firestore caps a single WriteBatch at 500 operations
+_MAX_BATCH_WRITES = 500
+
 
 def _get_db():
     """Lazy-initialize Firebase Admin SDK and return Firestore client.
@@ -124,6 +128,15 @@ def update_patient(patient_id: str, data: dict[str, Any]) -> None:
     db.collection("patients").document(patient_id).update(data)
 
 
+def remove_device_tokens(patient_id: str, tokens: list[str]) -> None:
+    """Remove stale FCM device tokens from a patient."""
+    db = _get_db()
+    db.collection("patients").document(patient_id).update({
+        "device_tokens": firestore.ArrayRemove(tokens),
+        "updated_at": _now_utc(),
+    })
+
+
 def list_active_patients() -> list[dict[str, Any]]:
     """List all patients with status 'active'."""
     db = _get_db()
@@ -158,6 +171,43 @@ def add_reminder_rule(patient_id: str, rule: dict[str, Any]) -> str:
     return doc_ref.id
 
 
+def batch_add_reminder_rules(
+    patient_id: str,
+    rules: list[dict[str, Any]],
+    patient_update: dict[str, Any] | None = None,
+) -> list[str]:
+    """Add several reminder rules (and optionally update the patient) with batched writes.
+
+    Returns the new rule IDs in input order.
+    """
+    db = _get_db()
+    patient_ref = db.collection("patients").document(patient_id)
+    rules_ref = patient_ref.collection("reminder_rules")
+
+    # (doc_ref, data, is_update); the patient update rides in the last batch
+    writes: list[tuple[Any, dict[str, Any], bool]] = []
+    rule_ids: list[str] = []
+    for rule in rules:
+        rule.setdefault("active", True)
+        rule.setdefault("created_from", "extraction_pipeline")
+        doc_ref = rules_ref.document()
+        rule_ids.append(doc_ref.id)
+        writes.append((doc_ref, rule, False))
+    if patient_update:
+        patient_update["updated_at"] = _now_utc()
+        writes.append((patient_ref, patient_update, True))
+
+    for start in range(0, len(writes), _MAX_BATCH_WRITES):
+        batch = db.batch()
+        for doc_ref, data, is_update in writes[start:start + _MAX_BATCH_WRITES]:
+            if is_update:
+                batch.update(doc_ref, data)
+            else:
+                batch.set(doc_ref, data)
+        batch.commit()
+    return rule_ids
+
+
 def get_reminder_rules(patient_id: str, active_only: bool = True) -> list[dict[str, Any]]:
     """Get all reminder rules for a patient."""
     db = _get_db()
@@ -211,6 +261,14 @@ def get_vitals_for_date(patient_id: str, date_iso: str, vital_type: str | None =
     return [{"id": d.id, **d.to_dict()} for d in docs]
 
 
+def get_vitals_by_type_for_date(patient_id: str, date_iso: str) -> dict[str, list[dict[str, Any]]]:
+    """Get all vital logs for a patient on a date in one query, grouped by type."""
+    by_type: dict[str, list[dict[str, Any]]] = {}
+    for log in get_vitals_for_date(patient_id, date_iso):
+        by_type.setdefault(log.get("type"), []).append(log)
+    return by_type
+
+
 def get_vitals_range(patient_id: str, vital_type: str, days: int = 7) -> list[dict[str, Any]]:
     """Get vital logs for the last N days."""
     db = _get_db()
@@ -330,6 +388,27 @@ def log_notification(patient_id: str, data: dict[str, Any]) -> str:
     return doc_ref.id
 
 
+def log_notifications_batch(entries: list[tuple[str, dict[str, Any]]]) -> None:
+    """Log several sent notifications as (patient_id, data) pairs using batched writes."""
+    if not entries:
+        return
+    db = _get_db()
+    for start in range(0, len(entries), _MAX_BATCH_WRITES):
+        batch = db.batch()
+        for patient_id, data in entries[start:start + _MAX_BATCH_WRITES]:
+            data.setdefault("sent_at", _now_utc())
+            data.setdefault("status", "sent")
+            data.setdefault("acknowledged", False)
+            doc_ref = (
+                db.collection("patients")
+                .document(patient_id)
+                .collection("notifications")
+                .document()
+            )
+            batch.set(doc_ref, data)
+        batch.commit()
+
+
 def get_notifications_for_date(patient_id: str, date_iso: str, rule_id: str | None = None) -> list[dict[str, Any]]:
     """Check if a notification was already sent for a rule today."""
     db = _get_db()
@@ -432,33 +511,17 @@ def list_patients_for_provider(provider_id: str) -> list[dict[str, Any]]:
 # Extractions  (replaces SQLite storage)
 # ---------------------------------------------------------------------------
 
-def save_extraction(extracted: dict[str, Any], simplified_summary: str) -> str:
+def save_extraction(extracted: dict[str, Any] | ExtractionView, simplified_summary: str) -> str:
     """Save an extraction to Firestore. Returns the document ID (string)."""
     import json
 
     db = _get_db()
+    view = as_view(extracted)
 
-    patient_name = ""
-    if isinstance(extracted.get("patient"), dict):
-        patient_name = str(extracted["patient"].get("full_name", "")).strip()
-
-    primary_diagnosis = ""
-    if isinstance(extracted.get("clinical_episode"), dict):
-        primary_diagnosis = str(extracted["clinical_episode"].get("primary_diagnosis", "")).strip()
-
-    followup_datetime = None
-    follow = extracted.get("follow_up", {})
-    if isinstance(follow, dict):
-        appointments = follow.get("appointments", [])
-        if isinstance(appointments, list) and appointments:
-            first = appointments[0]
-            if isinstance(first, dict):
-                followup_datetime = first.get("scheduled_datetime")
-
-    source_file = ""
-    source = extracted.get("source_document", {})
-    if isinstance(source, dict):
-        source_file = str(source.get("file_name", "")).strip()
+    patient_name = str(view.patient.get("full_name", "")).strip()
+    primary_diagnosis = str(view.clinical.get("primary_diagnosis", "")).strip()
+    followup_datetime = view.first_appointment.get("scheduled_datetime")
+    source_file = str(view.source_document.get("file_name", "")).strip()
 
     data = {
         "created_at": _now_utc(),
@@ -466,7 +529,8 @@ def save_extraction(extracted: dict[str, Any], simplified_summary: str) -> str:
         "patient_name": patient_name or None,
         "primary_diagnosis": primary_diagnosis or None,
         "followup_datetime": followup_datetime,
-        "extraction_json": json.dumps(extracted, ensure_ascii=True),
+        # Compact separators: the blob counts toward Firestore's 1 MiB document limit
+        "extraction_json": json.dumps(view.raw, ensure_ascii=True, separators=(",", ":")),
         "simplified_summary": simplified_summary,
         "status": "extracted",  # extracted → registered
     }
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import base64
 import json
+import random
 import re
+import time
 from typing import Any
 
 import requests
@@ -10,6 +12,13 @@ import requests
 from app.config import settings
 
 
+# Transient statuses worth another attempt: rate limiting and server-side errors.
+_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+_MAX_BACKOFF_SECONDS = 8.0
+# Inline batch requests are capped at 20 MB; leave room for the job envelope.
+_MAX_INLINE_BATCH_BYTES = 16 * 1024 * 1024
+
+
 class GeminiError(RuntimeError):
     pass
 
@@ -42,7 +51,165 @@ class GeminiClient:
                 },
             )
 
+        payload = self._request_body(system_prompt, parts, temperature)
+
+        url = f"{settings.gemini_api_base}/{model}:generateContent?key={self.api_key}"
+        response = self._post(url, payload)
+
+        if response.status_code >= 300:
+            raise GeminiError(f"Gemini API error {response.status_code}: {response.text[:500]}")
+
+        data = response.json()
+        text = self._extract_text(data)
+        return self._parse_json(text)
+
+    def batch_generate_json(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompts: list[str],
+        temperature: float = 0.1,
+        poll_interval: float = 30.0,
+        max_wait: float | None = None,
+    ) -> list[dict[str, Any] | GeminiError]:
+        """Run ``user_prompts`` as Batch Mode jobs and wait for them to finish.
+
+        Requests are split across as many jobs as the inline payload cap
+        needs. Returns one entry per prompt, in order: the parsed JSON object,
+        or the GeminiError for that request. A job that fails to submit or
+        finish, or is still running ``max_wait`` seconds (default
+        ``gemini_batch_max_wait``) after submission, marks each of its
+        requests with that job's error.
+        """
+        batch_requests = [
+            {
+                "request": self._request_body(system_prompt, [{"text": prompt}], temperature),
+                "metadata": {"key": str(index)},
+            }
+            for index, prompt in enumerate(user_prompts)
+        ]
+        results: list[dict[str, Any] | GeminiError] = [
+            GeminiError("Gemini batch returned no response for this request") for _ in user_prompts
+        ]
+
+        # Submit every job before polling so they run side by side.
+        jobs: list[tuple[list[int], str, dict[str, Any]]] = []
+        for part, indices in enumerate(self._split_batch(batch_requests)):
+            try:
+                name, operation = self._submit_batch(model, [batch_requests[i] for i in indices], part)
+            except GeminiError as exc:
+                for i in indices:
+                    results[i] = exc
+                continue
+            jobs.append((indices, name, operation))
+
+        deadline = time.monotonic() + (settings.gemini_batch_max_wait if max_wait is None else max_wait)
+        for indices, name, operation in jobs:
+            try:
+                operation = self._wait_for_batch(name, operation, poll_interval, deadline)
+            except GeminiError as exc:
+                for i in indices:
+                    results[i] = exc
+                continue
+
+            inlined = operation.get("response", {}).get("inlinedResponses", [])
+            if isinstance(inlined, dict):
+                inlined = inlined.get("inlinedResponses", [])
+            for position, item in enumerate(inlined):
+                key = str(item.get("metadata", {}).get("key", ""))
+                if key.isdigit():
+                    index = int(key)
+                elif position < len(indices):
+                    index = indices[position]
+                else:
+                    continue
+                if not 0 <= index < len(results):
+                    continue
+                if item.get("error"):
+                    results[index] = GeminiError(f"Gemini batch request failed: {item['error']}")
+                    continue
+                try:
+                    results[index] = self._parse_json(self._extract_text(item.get("response", {})))
+                except GeminiError as exc:
+                    results[index] = exc
+        return results
+
+    @staticmethod
+    def _split_batch(batch_requests: list[dict[str, Any]]) -> list[list[int]]:
+        """Group request indices into jobs whose inline payload stays under the cap."""
+        groups: list[list[int]] = []
+        current: list[int] = []
+        current_bytes = 0
+        for index, request in enumerate(batch_requests):
+            size = len(json.dumps(request).encode("utf-8"))
+            if current and current_bytes + size > _MAX_INLINE_BATCH_BYTES:
+                groups.append(current)
+                current, current_bytes = [], 0
+            current.append(index)
+            current_bytes += size
+        if current:
+            groups.append(current)
+        return groups
+
+    def _submit_batch(self, model: str, batch_requests: list[dict[str, Any]], part: int) -> tuple[str, dict[str, Any]]:
         payload = {
+            "batch": {
+                "display_name": f"sidiya-extraction-{int(time.time())}-{part}",
+                "input_config": {"requests": {"requests": batch_requests}},
+            }
+        }
+
+        # Not retried: a timed-out create may still have queued the job.
+        url = f"{settings.gemini_api_base}/{model}:batchGenerateContent?key={self.api_key}"
+        try:
+            response = requests.post(url, json=payload, timeout=settings.gemini_request_timeout)
+        except requests.RequestException as exc:
+            raise GeminiError(f"Gemini batch submission failed: {type(exc).__name__}") from exc
+        if response.status_code >= 300:
+            raise GeminiError(f"Gemini batch API error {response.status_code}: {response.text[:500]}")
+
+        operation = response.json()
+        name = operation.get("name")
+        if not name:
+            raise GeminiError(f"Gemini batch response missing job name: {str(operation)[:300]}")
+        return name, operation
+
+    def _wait_for_batch(
+        self, name: str, operation: dict[str, Any], poll_interval: float, deadline: float
+    ) -> dict[str, Any]:
+        # Operations live under the API root, not under /models.
+        api_root = settings.gemini_api_base.rsplit("/models", 1)[0]
+        status_url = f"{api_root}/{name}?key={self.api_key}"
+        while not operation.get("done"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._cancel_batch(api_root, name)
+                raise GeminiError(f"Gemini batch {name} did not finish in time")
+            time.sleep(min(poll_interval, remaining))
+            try:
+                response = requests.get(status_url, timeout=settings.gemini_request_timeout)
+            except (requests.Timeout, requests.ConnectionError):
+                continue
+            if response.status_code in _RETRYABLE_STATUS:
+                continue
+            if response.status_code >= 300:
+                raise GeminiError(f"Gemini batch status error {response.status_code}: {response.text[:500]}")
+            operation = response.json()
+
+        if operation.get("error"):
+            raise GeminiError(f"Gemini batch {name} failed: {operation['error']}")
+        return operation
+
+    def _cancel_batch(self, api_root: str, name: str) -> None:
+        """Best-effort cancel of an abandoned job so it stops consuming quota."""
+        try:
+            requests.post(f"{api_root}/{name}:cancel?key={self.api_key}", timeout=settings.gemini_request_timeout)
+        except requests.RequestException:
+            pass
+
+    @staticmethod
+    def _request_body(system_prompt: str, parts: list[dict[str, Any]], temperature: float) -> dict[str, Any]:
+        return {
             "system_instruction": {"parts": [{"text": system_prompt}]},
             "contents": [{"parts": parts}],
             "generationConfig": {
@@ -51,15 +218,27 @@ class GeminiClient:
             },
         }
 
-        url = f"{settings.gemini_api_base}/{model}:generateContent?key={self.api_key}"
-        response = requests.post(url, json=payload, timeout=120)
-
-        if response.status_code >= 300:
-            raise GeminiError(f"Gemini API error {response.status_code}: {response.text[:500]}")
+    @staticmethod
+    def _post(url: str, payload: dict[str, Any]) -> requests.Response:
+        """POST with a per-attempt timeout, retrying timeouts and transient errors.
 
-        data = response.json()
-        text = self._extract_text(data)
-        return self._parse_json(text)
+        A slow call is abandoned after ``gemini_request_timeout`` and retried
+        with full-jitter backoff, rather than waiting out the latency tail.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = requests.post(url, json=payload, timeout=settings.gemini_request_timeout)
+                if response.status_code not in _RETRYABLE_STATUS or attempt >= settings.gemini_max_retries:
+                    return response
+            except (requests.Timeout, requests.ConnectionError) as exc:
+                if attempt >= settings.gemini_max_retries:
+                    # The exception text can echo the URL, which carries the API key.
+                    raise GeminiError(
+                        f"Gemini request failed after {attempt + 1} attempt(s): {type(exc).__name__}"
+                    ) from exc
+            attempt += 1
+            time.sleep(random.uniform(0, min(_MAX_BACKOFF_SECONDS, 2.0**attempt)))
 
     @staticmethod
     def _extract_text(api_response: dict[str, Any]) -> str:
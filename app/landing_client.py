@@ -32,7 +32,7 @@ class LandingClient:
             headers=headers,
             data=data,
             files=files,
-            timeout=180,
+            timeout=settings.landing_request_timeout,
         )
         if response.status_code >= 300:
             raise LandingError(f"Landing Parse error {response.status_code}: {response.text[:500]}")
@@ -15,7 +15,8 @@ from pydantic import BaseModel
 
 from app.gemini_client import GeminiError
 from app.config import settings
-from app.pipeline import run_extraction
+from app.extraction_view import ExtractionView
+from app.pipeline import run_extraction, warm_schema_validator
 from app.storage import get_extraction, list_extractions, save_extraction
 from app.summary import build_simplified_summary
 
@@ -58,8 +59,9 @@ async def add_cache_headers(request: Request, call_next):
 
 @app.on_event("startup")
 def startup_event() -> None:
-    # Firestore needs no init; kept as hook for future startup tasks
-    pass
+    # Firestore needs no init. Load and compile the output schema here so the
+    # first extraction request does not pay for it.
+    warm_schema_validator()
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -167,8 +169,9 @@ async def extract(pdf: UploadFile = File(...)) -> dict:
         except Exception as exc:  # noqa: BLE001
             raise HTTPException(status_code=500, detail=f"Unexpected error: {exc}") from exc
 
-    summary_text = build_simplified_summary(output)
-    extraction_id = save_extraction(output, summary_text)
+    view = ExtractionView.from_dict(output)
+    summary_text = build_simplified_summary(view)
+    extraction_id = save_extraction(view, summary_text)
     output["extraction_id"] = extraction_id
     output["simplified_summary"] = summary_text
     return output
@@ -196,7 +199,7 @@ def register_patient(req: PatientRegisterRequest) -> dict:
     if record is None:
         raise HTTPException(status_code=404, detail="Extraction not found")
 
-    extraction = record["extraction_json"]
+    view = ExtractionView.from_dict(record["extraction_json"])
 
     # Check if patient already registered for this extraction
     existing = fdb.get_patient_by_extraction(req.extraction_id)
@@ -206,16 +209,16 @@ def register_patient(req: PatientRegisterRequest) -> dict:
     # Create patient in Firestore
     patient_data = {
         "extraction_id": req.extraction_id,
-        "full_name": extraction.get("patient", {}).get("full_name", "Unknown"),
-        "dob": extraction.get("patient", {}).get("dob"),
-        "sex": extraction.get("patient", {}).get("sex_at_birth"),
-        "mrn": extraction.get("patient", {}).get("mrn"),
+        "full_name": view.patient.get("full_name", "Unknown"),
+        "dob": view.patient.get("dob"),
+        "sex": view.patient.get("sex_at_birth"),
+        "mrn": view.patient.get("mrn"),
         "phone": req.phone,
         "caregiver_phone": req.caregiver_phone,
         "nurse_phone": req.nurse_phone,
-        "primary_diagnosis": extraction.get("clinical_episode", {}).get("primary_diagnosis"),
-        "care_plan_start_date": extraction.get("care_plan_90d", {}).get("start_date"),
-        "care_plan_end_date": extraction.get("care_plan_90d", {}).get("end_date"),
+        "primary_diagnosis": view.clinical.get("primary_diagnosis"),
+        "care_plan_start_date": view.care_start,
+        "care_plan_end_date": view.care_end,
     }
     patient_id = fdb.create_patient(patient_data)
 
@@ -223,7 +226,7 @@ def register_patient(req: PatientRegisterRequest) -> dict:
     fdb.update_extraction(req.extraction_id, {"status": "registered", "patient_id": patient_id})
 
     # Generate reminder rules from extraction
-    rule_counts = generate_reminder_rules(patient_id, extraction)
+    rule_counts = generate_reminder_rules(patient_id, view)
 
     return {
         "patient_id": patient_id,
@@ -275,9 +278,10 @@ def patient_today(patient_id: str) -> dict:
             pass
 
     # Get today's vitals
-    weight_logs = fdb.get_vitals_for_date(patient_id, today_iso, "weight")
-    bp_logs = fdb.get_vitals_for_date(patient_id, today_iso, "bp")
-    symptom_logs = fdb.get_vitals_for_date(patient_id, today_iso, "symptom_check")
+    vitals = fdb.get_vitals_by_type_for_date(patient_id, today_iso)
+    weight_logs = vitals.get("weight", [])
+    bp_logs = vitals.get("bp", [])
+    symptom_logs = vitals.get("symptom_check", [])
 
     # Get today's medication status
     med_logs = fdb.get_medication_logs_for_date(patient_id, today_iso)
@@ -465,14 +469,11 @@ def patient_care_plan(patient_id: str) -> dict:
     if not record:
         raise HTTPException(status_code=404, detail="Extraction not found")
 
-    extraction = record["extraction_json"]
-    care_plan = extraction.get("care_plan_90d", {})
-    red_flags = extraction.get("clinical_modules", {}).get("chf", {}).get("red_flags", {})
-    medications = extraction.get("medications", {})
+    view = ExtractionView.from_dict(record["extraction_json"])
 
     now = datetime.now(timezone.utc) + timedelta(hours=5, minutes=30)
     care_plan_day = 0
-    care_start = care_plan.get("start_date")
+    care_start = view.care_start
     if care_start:
         try:
             start = datetime.fromisoformat(care_start).date()
@@ -482,10 +483,10 @@ def patient_care_plan(patient_id: str) -> dict:
 
     return {
         "care_plan_day": care_plan_day,
-        "care_plan": care_plan,
-        "red_flags": red_flags,
-        "medications": medications,
-        "discharge_advice": extraction.get("extracted_details", {}).get("discharge_advice", {}),
+        "care_plan": view.care_plan,
+        "red_flags": view.red_flags,
+        "medications": view.medications,
+        "discharge_advice": view.discharge_advice,
     }
 
 
@@ -6,43 +6,112 @@ WhatsApp support is planned for Phase 2.
 
 from __future__ import annotations
 
+import copy
 import logging
-from datetime import datetime, timezone
-from typing import Any
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
 
 from app.config import settings
 from app import firestore_client as fdb
 
 logger = logging.getLogger(__name__)
 
+# Reminder schedules are authored in Indian Standard Time (UTC+5:30)
+IST = timezone(timedelta(hours=5, minutes=30))
+
 
 # ---------------------------------------------------------------------------
 # FCM Push Notifications
 # ---------------------------------------------------------------------------
 
-def _send_fcm(device_tokens: list[str], title: str, body: str, data: dict | None = None) -> bool:
-    """Send push notification via Firebase Cloud Messaging."""
-    if not device_tokens:
+# Tokens FCM reported as unregistered or bound to another sender → monotonic
+# expiry time.
+# Lets us skip the FCM round-trip for patients who uninstalled the app.
+_DEAD_TOKEN_TTL_SECONDS = 24 * 60 * 60
+_DEAD_TOKEN_MAX = 10_000
+_dead_tokens: dict[str, float] = {}
+
+
+def _is_dead_token(token: str) -> bool:
+    expires_at = _dead_tokens.get(token)
+    if expires_at is None:
+        return False
+    if expires_at <= time.monotonic():
+        _dead_tokens.pop(token, None)
+        return False
+    return True
+
+
+def _mark_dead_tokens(tokens: list[str]) -> None:
+    now = time.monotonic()
+    if len(_dead_tokens) + len(tokens) > _DEAD_TOKEN_MAX:
+        for token in [t for t, expires_at in _dead_tokens.items() if expires_at <= now]:
+            del _dead_tokens[token]
+        # Still full: evict oldest entries (dicts keep insertion order)
+        while _dead_tokens and len(_dead_tokens) + len(tokens) > _DEAD_TOKEN_MAX:
+            del _dead_tokens[next(iter(_dead_tokens))]
+    expires_at = now + _DEAD_TOKEN_TTL_SECONDS
+    for token in tokens:
+        _dead_tokens[token] = expires_at
+
+
+def _send_fcm(
+    device_tokens: list[str],
+    title: str,
+    body: str,
+    data: dict | None = None,
+    patient_id: str | None = None,
+) -> bool:
+    """Send push notification via Firebase Cloud Messaging.
+
+    Tokens recently rejected by FCM are skipped; newly rejected tokens are
+    cached and removed from the patient document when ``patient_id`` is given.
+    """
+    tokens = [t for t in device_tokens if not _is_dead_token(t)]
+    if not tokens:
         return False
 
     try:
+        from firebase_admin import exceptions as firebase_exceptions
         from firebase_admin import messaging
 
         message = messaging.MulticastMessage(
             notification=messaging.Notification(title=title, body=body),
             data=data or {},
-            tokens=device_tokens,
+            tokens=tokens,
         )
         response = messaging.send_each_for_multicast(message)
         success = response.success_count > 0
         if response.failure_count > 0:
-            logger.warning("FCM: %d/%d failures", response.failure_count, len(device_tokens))
+            logger.warning("FCM: %d/%d failures", response.failure_count, len(tokens))
+            dead = []
+            for token, result in zip(tokens, response.responses):
+                if isinstance(result.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                    dead.append(token)
+                elif isinstance(result.exception, firebase_exceptions.InvalidArgumentError):
+                    # Also raised for message-level faults (payload size, bad
+                    # data field), so it does not prove the token is dead.
+                    logger.warning("FCM rejected message as invalid: %s", result.exception)
+            if dead:
+                _mark_dead_tokens(dead)
+                if patient_id:
+                    _prune_device_tokens(patient_id, dead)
         return success
     except Exception:
         logger.exception("FCM send failed")
         return False
 
 
+def _prune_device_tokens(patient_id: str, tokens: list[str]) -> None:
+    """Best-effort removal of dead FCM tokens from the patient document."""
+    try:
+        fdb.remove_device_tokens(patient_id, tokens)
+        logger.info("Removed %d stale FCM token(s) for patient %s", len(tokens), patient_id)
+    except Exception:
+        logger.exception("Failed to remove stale FCM tokens for patient %s", patient_id)
+
+
 # ---------------------------------------------------------------------------
 # Twilio SMS
 # ---------------------------------------------------------------------------
@@ -82,11 +151,13 @@ def send_notification(
     notification_type: str,
     rule_id: str | None = None,
     data: dict | None = None,
+    pending_logs: list[tuple[str, dict[str, Any]]] | None = None,
 ) -> str:
     """Send notification via preferred channel with fallback.
 
     Returns the channel used: "push", "sms", or "failed".
-    Also logs the notification to Firestore.
+    Also logs the notification to Firestore, or appends the log entry to
+    ``pending_logs`` so the caller can write them in one batch.
     """
     patient_id = patient["id"]
     prefs = patient.get("notification_preferences", {})
@@ -94,7 +165,7 @@ def send_notification(
 
     # Try push first
     if prefs.get("push") and patient.get("device_tokens"):
-        if _send_fcm(patient["device_tokens"], title, body, data):
+        if _send_fcm(patient["device_tokens"], title, body, data, patient_id=patient_id):
             channel = "push"
 
     # Fallback to SMS
@@ -104,16 +175,21 @@ def send_notification(
             channel = "sms"
 
     # Log notification to Firestore
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    fdb.log_notification(patient_id, {
+    now = datetime.now(timezone.utc)
+    log_entry = {
         "rule_id": rule_id,
         "type": notification_type,
         "channel": channel,
         "title": title,
         "message_text": body,
         "status": "sent" if channel != "failed" else "failed",
-        "date": today,
-    })
+        "date": now.strftime("%Y-%m-%d"),
+        "sent_at": now,
+    }
+    if pending_logs is not None:
+        pending_logs.append((patient_id, log_entry))
+    else:
+        fdb.log_notification(patient_id, log_entry)
 
     if channel == "failed":
         logger.error("All notification channels failed for patient %s", patient_id)
@@ -127,73 +203,98 @@ def send_notification(
 # Cron: Evaluate and send due reminders
 # ---------------------------------------------------------------------------
 
+# Active-patient snapshot private to the reminder cron. The TTL stays under
+# the 5-minute tick so every tick sees fresh registrations and
+# deactivations; it only spares a rescan on retries within a tick.
+_ACTIVE_PATIENTS_TTL_SECONDS = 240
+_active_patients_snapshot: tuple[float, list[dict[str, Any]]] | None = None
+
+
+def _active_patients_for_cron() -> list[dict[str, Any]]:
+    """Return copies of the cached active patients, refreshing when stale."""
+    global _active_patients_snapshot
+    now = time.monotonic()
+    if _active_patients_snapshot is None or _active_patients_snapshot[0] <= now:
+        _active_patients_snapshot = (now + _ACTIVE_PATIENTS_TTL_SECONDS, fdb.list_active_patients())
+    return copy.deepcopy(_active_patients_snapshot[1])
+
+
 def evaluate_and_send_reminders() -> dict[str, int]:
     """Main cron job: evaluate all reminder rules and send due notifications.
 
     Called by Cloud Scheduler every 5 minutes.
     Returns summary counts.
     """
-    now = datetime.now(timezone.utc)
-    # Convert to IST for Indian patients (UTC+5:30)
-    from datetime import timedelta
-    ist_now = now + timedelta(hours=5, minutes=30)
-    current_time = ist_now.strftime("%H:%M")
-    today_iso = ist_now.strftime("%Y-%m-%d")
+    ist_now = datetime.now(IST)
+    current_minutes = ist_now.hour * 60 + ist_now.minute
+    today_iso = ist_now.date().isoformat()
 
     stats = {"evaluated": 0, "sent": 0, "skipped": 0, "failed": 0}
 
-    patients = fdb.list_active_patients()
-    for patient in patients:
-        patient_id = patient["id"]
-        rules = fdb.get_reminder_rules(patient_id)
-
-        for rule in rules:
-            stats["evaluated"] += 1
-            rule_id = rule.get("id")
-            schedule = rule.get("schedule", {})
-            times = schedule.get("times", [])
-            days = schedule.get("days", "daily")
-
-            # Check if this rule should fire now
-            if not _is_rule_due(current_time, today_iso, times, days):
-                continue
-
-            # Check if already sent today for this rule
-            existing = fdb.get_notifications_for_date(patient_id, today_iso, rule_id)
-            if existing:
-                stats["skipped"] += 1
-                continue
-
-            # Build notification content
-            title, body = _build_notification_content(rule)
-
-            # Skip nurse-targeted reminders for patient delivery
-            if rule.get("target") == "nurse":
-                stats["skipped"] += 1
-                continue
-
-            channel = send_notification(
-                patient=patient,
-                title=title,
-                body=body,
-                notification_type=rule["type"],
-                rule_id=rule_id,
-            )
-            if channel != "failed":
-                stats["sent"] += 1
-            else:
-                stats["failed"] += 1
+    # Notification logs are batched per patient, not written per send, and
+    # flushed before the next patient so retries and overlapping runs see them
+    pending_logs: list[tuple[str, dict[str, Any]]] = []
+    try:
+        patients = _active_patients_for_cron()
+        for patient in patients:
+            patient_id = patient["id"]
+            rules = fdb.get_reminder_rules(patient_id)
+
+            for rule in rules:
+                stats["evaluated"] += 1
+                rule_id = rule.get("id")
+                schedule = rule.get("schedule", {})
+                times = schedule.get("times", [])
+                days = schedule.get("days", "daily")
+
+                # Check if this rule should fire now
+                if not _is_rule_due(current_minutes, today_iso, times, days):
+                    continue
+
+                # Check if already sent today for this rule
+                existing = fdb.get_notifications_for_date(patient_id, today_iso, rule_id)
+                if existing:
+                    stats["skipped"] += 1
+                    continue
+
+                # Skip nurse-targeted reminders for patient delivery
+                if rule.get("target") == "nurse":
+                    stats["skipped"] += 1
+                    continue
+
+                # Text is pre-rendered at rule creation; older rules build it here
+                title = rule.get("notification_title")
+                body = rule.get("notification_body")
+                if title is None or body is None:
+                    title, body = _build_notification_content(rule)
+
+                channel = send_notification(
+                    patient=patient,
+                    title=title,
+                    body=body,
+                    notification_type=rule["type"],
+                    rule_id=rule_id,
+                    pending_logs=pending_logs,
+                )
+                if channel != "failed":
+                    stats["sent"] += 1
+                else:
+                    stats["failed"] += 1
+
+            if pending_logs:
+                fdb.log_notifications_batch(pending_logs)
+                pending_logs.clear()
+    finally:
+        # Sends from a patient interrupted by an error are still logged
+        fdb.log_notifications_batch(pending_logs)
 
     logger.info("Reminder evaluation complete: %s", stats)
     return stats
 
 
-def _is_rule_due(current_time: str, today_iso: str, times: list[str], days: Any) -> bool:
-    """Check if a reminder rule should fire at the current time."""
+def _is_rule_due(current_minutes: int, today_iso: str, times: list[str], days: Any) -> bool:
+    """Check if a reminder rule should fire at the current time (minutes since midnight)."""
     # Check time window (within 5 minutes of scheduled time)
-    current_h, current_m = map(int, current_time.split(":"))
-    current_minutes = current_h * 60 + current_m
-
     time_match = False
     for t in times:
         try:
@@ -220,46 +321,43 @@ def _is_rule_due(current_time: str, today_iso: str, times: list[str], days: Any)
     return True
 
 
+def _build_medication_content(payload: dict[str, Any]) -> tuple[str, str]:
+    med_name = payload.get("medication_name", "your medication")
+    dose = payload.get("dose", "")
+    indication = payload.get("indication", "")
+    body = f"Time to take {med_name}"
+    if dose and dose != "unknown":
+        body += f" ({dose})"
+    if indication and indication != "unknown":
+        body += f" — {indication}"
+    return "Medication Reminder", body
+
+
+def _message_content(title: str, default_body: str) -> Callable[[dict[str, Any]], tuple[str, str]]:
+    def build(payload: dict[str, Any]) -> tuple[str, str]:
+        return title, payload.get("message", default_body)
+    return build
+
+
+_build_default_content = _message_content("Sidiya Reminder", "You have a pending task.")
+
+# Rule type → (payload → (title, body))
+_CONTENT_BUILDERS: dict[str, Callable[[dict[str, Any]], tuple[str, str]]] = {
+    "medication": _build_medication_content,
+    "weight": _message_content("Weight Check", "Please log your weight."),
+    "bp": _message_content("BP Check", "Please log your blood pressure."),
+    "symptom_check": _message_content("Evening Check-in", "How are you feeling today?"),
+    "appointment": _message_content("Appointment Reminder", "You have an upcoming appointment."),
+    "nurse_checkin": _message_content("Nurse Check-in", "Nurse check-in scheduled for today."),
+}
+
+
 def _build_notification_content(rule: dict[str, Any]) -> tuple[str, str]:
     """Build title and body for a notification based on rule type."""
-    rule_type = rule.get("type", "")
-    payload = rule.get("payload", {})
-
-    if rule_type == "medication":
-        med_name = payload.get("medication_name", "your medication")
-        dose = payload.get("dose", "")
-        indication = payload.get("indication", "")
-        title = "Medication Reminder"
-        body = f"Time to take {med_name}"
-        if dose and dose != "unknown":
-            body += f" ({dose})"
-        if indication and indication != "unknown":
-            body += f" — {indication}"
-        return title, body
-
-    if rule_type == "weight":
-        title = "Weight Check"
-        body = payload.get("message", "Please log your weight.")
-        return title, body
-
-    if rule_type == "bp":
-        title = "BP Check"
-        body = payload.get("message", "Please log your blood pressure.")
-        return title, body
-
-    if rule_type == "symptom_check":
-        title = "Evening Check-in"
-        body = payload.get("message", "How are you feeling today?")
-        return title, body
-
-    if rule_type == "appointment":
-        title = "Appointment Reminder"
-        body = payload.get("message", "You have an upcoming appointment.")
-        return title, body
-
-    if rule_type == "nurse_checkin":
-        title = "Nurse Check-in"
-        body = payload.get("message", "Nurse check-in scheduled for today.")
-        return title, body
-
-    return "Sidiya Reminder", payload.get("message", "You have a pending task.")
+    builder = _CONTENT_BUILDERS.get(rule.get("type", ""), _build_default_content)
+    return builder(rule.get("payload", {}))
+
+
+def render_notification_content(rule: dict[str, Any]) -> tuple[str, str]:
+    """Public entry point: the (title, body) a reminder rule will be sent with."""
+    return _build_notification_content(rule)
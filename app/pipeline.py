@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import functools
 import html
 import json
 import re
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any
 
-from jsonschema import ValidationError, validate
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
 
 from app.config import settings
 from app.gemini_client import GeminiClient, GeminiError
@@ -37,6 +42,215 @@ If uncertain but inferable from drug class/name, provide "likely <purpose>" inst
 
 _DATE_RE = re.compile(r"\b(\d{1,2}/\d{1,2}/\d{2,4})\b")
 
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%m/%d/%Y")
+_DATETIME_FORMATS = (
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%d/%m/%y",
+)
+_DATE_ONLY_DATETIME_FORMATS = ("%d/%m/%Y", "%d/%m/%y")
+
+_UNKNOWN_VALUES = frozenset({"", "unknown", "na", "n/a", "not available", "none", "nil"})
+_UNKNOWN_MAX_LEN = max(map(len, _UNKNOWN_VALUES))
+
+_TAG_RE = re.compile(r"<[^>]+>")
+# Landing.ai chunk anchors and element ids: no meaning to the model, but a
+# few tokens on every chunk and table cell of the prompt.
+_PROMPT_ID_RE = re.compile(r"<a id=(?:'[^'>]*'|\"[^\">]*\")></a>\n?| id=(?:'[^'>]*'|\"[^\">]*\")")
+# a-z plus the non-ASCII letters IGNORECASE treats as I, K or S (dotted and
+# dotless i, Kelvin sign, long s), all mapped one-to-one.
+_ASCII_UPPER = str.maketrans(
+    "abcdefghijklmnopqrstuvwxyz\u0130\u0131\u212a\u017f",
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZIIKS",
+)
+
+# Markdown heuristics (Landing.ai parse output). Patterns that scan the whole
+# document are matched case-sensitively against its _ascii_upper() copy, so
+# their literals are written in uppercase; captured text is sliced back out of
+# the original markdown by span.
+_MRN_RE = re.compile(r"\bUHID\s*[:\-]\s*([A-Z0-9]+)")
+_NAME_RE = re.compile(r"\bNAME\s*[:\-]\s*([A-Z][A-Z\.\s]+)")
+_IP_NO_RE = re.compile(r"\bIP\s*NO\.?\s*[:\-]\s*([A-Z0-9]+)")
+_PHONE_RE = re.compile(r"\bPHONE\s*NO\.?\s*[:\-]\s*([0-9+\-\s]{8,20})")
+_ADDRESS_RE = re.compile(r"\bADDRESS\s*[:\-]\s*(.+?)\s*(?:</TD>|\\N<TR>|\\N<A ID=)", re.DOTALL)
+_AGE_SEX_RE = re.compile(r"\((\d+)\s*YEARS\s*/\s*([MF])\)")
+_DOA_RE = re.compile(r"\bDOA\b\s*:?\s*(?:</TD>\s*<TD[^>]*>)?\s*(\d{1,2}/\d{1,2}/\d{2,4})", re.DOTALL)
+_DOD_RE = re.compile(r"\bDOD\b\s*:?\s*(?:</TD>\s*<TD[^>]*>)?\s*(\d{1,2}/\d{1,2}/\d{2,4})", re.DOTALL)
+_DIAGNOSIS_BLOCK_RE = re.compile(
+    r"\*\*DIAGNOSIS\s*:\*\*(.*?)(?:\n<A ID=|<!-- PAGE BREAK -->|BRIEF HISTORY|COURSE IN THE HOSPITAL)",
+    re.DOTALL,
+)
+_BULLET_RE = re.compile(r"^\s*\*\s*(.+)$", re.MULTILINE)
+_LVEF_RE = re.compile(r"EF\s*[-:=]?\s*(\d{1,2}(?:\.\d+)?)\s*%", re.IGNORECASE)
+_BRIEF_HISTORY_RE = re.compile(
+    r"BRIEF HISTORY\s*:\s*(.*?)(?:\n<A ID=|O/E:|S/E|INVESTIGATIONS|COURSE IN THE HOSPITAL)",
+    re.DOTALL,
+)
+_COURSE_RE = re.compile(
+    r"COURSE IN THE HOSPITAL\s*:\s*(.*?)(?:\n<A ID=|<TABLE ID=\"5-1\"|PRESCRIPTION DETAILS|ADVICE ON DISCHARGE)",
+    re.DOTALL,
+)
+_PAST_HISTORY_RE = re.compile(
+    r"NAME:\s*[A-Z\.\s]+</A>\s*(.*?)\s*<A ID='[^']+'></A>\s*PLAN\s*:",
+    re.DOTALL,
+)
+_ECHO_RE = re.compile(r"ECHO\s*\((\d{1,2}/\d{1,2}/\d{2,4})\)\s*:(.*?)(?:\n<A ID=|COURSE IN THE HOSPITAL)", re.DOTALL)
+_FOLLOWUP_CELL_RE = re.compile(r"FOLLOW\s*UP</TD><TD[^>]*>(.*?)</TD>", re.DOTALL)
+_FOLLOWUP_LINE_RE = re.compile(r"(REVIEW\s+WITH\s+DR\.?[^<\n]{10,300})")
+_FOLLOWUP_DOCTOR_RE = re.compile(r"REVIEW\s+WITH\s+DR\.?\s*([A-Z][A-Z\.\s]+?)(?:\s+ON\b|\s*,|\s+IN\b)", re.IGNORECASE)
+_TEST_SPLIT_RE = re.compile(r",|/|\\bAND\\b", re.IGNORECASE)
+_SIGNATURE_DOCTOR_RE = re.compile(r"DR\.\s*([A-Z\.\s]+),")
+_DIET_RE = re.compile(r"DIET</TD><TD[^>]*>(.*?)</TD>", re.DOTALL)
+_FLUID_RE = re.compile(r"RESTRICTED FLUID.*?</TD><TD[^>]*>(.*?)</TD>", re.DOTALL)
+_ACTIVITY_RE = re.compile(r"PHYSICAL ACTIVITY</TD><TD[^>]*>(.*?)</TD>", re.DOTALL)
+_EMERGENCY_TABLE_RE = re.compile(r"<TABLE ID=\"7-1\">(.*?)</TABLE>", re.DOTALL)
+_EMERGENCY_ROW_RE = re.compile(r"<TR><TD[^>]*>(.*?)</TD><TD[^>]*>", re.DOTALL)
+# Uppercased literal prefixes of the patterns above, located once per document
+_HEURISTIC_MARKERS = (
+    "UHID",
+    "NAME",
+    "IP",
+    "PHONE",
+    "ADDRESS",
+    "DOA",
+    "DOD",
+    "**DIAGNOSIS",
+    "BRIEF HISTORY",
+    "COURSE IN THE HOSPITAL",
+    "NAME:",
+    "ECHO",
+    "FOLLOW",
+    "REVIEW",
+    "DR.",
+    "DIET</TD>",
+    "RESTRICTED FLUID",
+    "PHYSICAL ACTIVITY</TD>",
+    '<TABLE ID="7-1">',
+)
+# Checked in order: the first token found wins (e.g. "ORAL" beats "IV").
+_ROUTE_TOKENS = (
+    ("ORAL", "ORAL"),
+    ("IV", "IV"),
+    ("IM", "IM"),
+    ("SC", "SC"),
+    ("SUBCUT", "SC"),
+    ("INHAL", "INHALATION"),
+    ("NEB", "INHALATION"),
+    ("TOPICAL", "TOPICAL"),
+)
+# Bytes dropped when normalising medication names: everything but a-z and 0-9.
+_NON_ALNUM_BYTES = bytes(b for b in range(128) if not (chr(b).isdigit() or "a" <= chr(b) <= "z"))
+# Concurrent Landing.ai parses when preparing a batch job
+_BATCH_PARSE_WORKERS = 4
+# Medication rows per indication prompt; past this, answers get sloppier.
+_INDICATION_BATCH_SIZE = 15
+# Secondary diagnoses included as indication-prompt context
+_INDICATION_CONTEXT_DIAGNOSES = 5
+# Known purposes of common CHF discharge drugs, by generic or Indian brand
+# name, so most rows never need a Gemini lookup.
+_DIURETIC = "Diuretic for fluid removal"
+_BETA_BLOCKER = "Heart-failure therapy and heart-rate/BP control (beta-blocker)"
+_MRA = "Heart-failure therapy (aldosterone antagonist)"
+_ACE_ARB = "BP control and heart-failure therapy"
+_SGLT2 = "Heart-failure therapy (SGLT2 inhibitor)"
+_ANTIPLATELET = "Antiplatelet"
+_ANTICOAGULANT = "Anticoagulation"
+_STATIN = "Lipid lowering"
+_PPI = "Gastric protection"
+_INDICATION_HINTS: dict[str, str] = {
+    "furosemide": _DIURETIC,
+    "frusemide": _DIURETIC,
+    "lasix": _DIURETIC,
+    "torsemide": _DIURETIC,
+    "torasemide": _DIURETIC,
+    "dytor": _DIURETIC,
+    "metolazone": _DIURETIC,
+    "spironolactone": _MRA,
+    "aldactone": _MRA,
+    "eplerenone": _MRA,
+    "eptus": _MRA,
+    "metoprolol": _BETA_BLOCKER,
+    "metolar": _BETA_BLOCKER,
+    "revelol": _BETA_BLOCKER,
+    "carvedilol": _BETA_BLOCKER,
+    "cardivas": _BETA_BLOCKER,
+    "bisoprolol": _BETA_BLOCKER,
+    "concor": _BETA_BLOCKER,
+    "nebivolol": _BETA_BLOCKER,
+    "sacubitril": "Heart-failure therapy (ARNI)",
+    "vymada": "Heart-failure therapy (ARNI)",
+    "enalapril": _ACE_ARB,
+    "ramipril": _ACE_ARB,
+    "lisinopril": _ACE_ARB,
+    "valsartan": _ACE_ARB,
+    "losartan": _ACE_ARB,
+    "telmisartan": _ACE_ARB,
+    "telma": _ACE_ARB,
+    "dapagliflozin": _SGLT2,
+    "empagliflozin": _SGLT2,
+    "forxiga": _SGLT2,
+    "jardiance": _SGLT2,
+    "ivabradine": "Heart-rate control in heart failure",
+    "digoxin": "Heart-failure therapy and heart-rate control",
+    "amiodarone": "Antiarrhythmic",
+    "aspirin": _ANTIPLATELET,
+    "ecosprin": _ANTIPLATELET,
+    "clopidogrel": _ANTIPLATELET,
+    "clopilet": _ANTIPLATELET,
+    "ticagrelor": _ANTIPLATELET,
+    "brilinta": _ANTIPLATELET,
+    "prasugrel": _ANTIPLATELET,
+    "warfarin": _ANTICOAGULANT,
+    "acitrom": _ANTICOAGULANT,
+    "acenocoumarol": _ANTICOAGULANT,
+    "apixaban": _ANTICOAGULANT,
+    "eliquis": _ANTICOAGULANT,
+    "rivaroxaban": _ANTICOAGULANT,
+    "xarelto": _ANTICOAGULANT,
+    "dabigatran": _ANTICOAGULANT,
+    "enoxaparin": _ANTICOAGULANT,
+    "clexane": _ANTICOAGULANT,
+    "heparin": _ANTICOAGULANT,
+    "atorvastatin": _STATIN,
+    "atorva": _STATIN,
+    "rosuvastatin": _STATIN,
+    "rosuvas": _STATIN,
+    "pantoprazole": _PPI,
+    "pantop": _PPI,
+    "pantocid": _PPI,
+    "pan": _PPI,
+    "rabeprazole": _PPI,
+    "razo": _PPI,
+    "omeprazole": _PPI,
+    "esomeprazole": _PPI,
+    "metformin": "Diabetes control",
+    "amlodipine": "BP control",
+    "paracetamol": "Pain control",
+    "dolo": "Pain control",
+}
+# Dosage-form and release words skipped when finding a row's drug name
+_DOSAGE_FORM_WORDS = frozenset(
+    {"t", "c", "tab", "tabs", "tablet", "cap", "caps", "capsule", "inj", "injection",
+     "syp", "syrup", "drop", "drops", "oint", "ointment", "susp", "sr", "xl", "er", "cr"}
+)
+_WORD_RE = re.compile(r"[a-z]+")
+# Inferred indications by normalised drug name, shared across documents
+_INDICATION_CACHE_MAX = 4096
+_indication_cache: dict[str, str] = {}
+_indication_cache_lock = threading.Lock()
+_MED_TOKENS = ("TAB", "CAP", "INJ", "SYP", "SYRUP", "DROP", "OINT")
+# Body of one table cell: anything up to, but never across, its own </TD>.
+_MED_CELL = r"[^<]*(?:<(?!/TD>)[^<]*)*"
+_MED_ROW_RE = re.compile(
+    r"<TR><TD[^>]*>\s*\d+\s*</TD>"
+    + 4 * (r"<TD[^>]*>(" + _MED_CELL + r")</TD>")
+    # Any number of trailing cells (duration, quantity, notes, ...)
+    + r"(?:<TD[^>]*>" + _MED_CELL + r"</TD>)*</TR>"
+)
+
 
 def _landing_to_ocr_payload(parsed: dict[str, Any]) -> dict[str, Any]:
     metadata = parsed.get("metadata", {}) if isinstance(parsed.get("metadata"), dict) else {}
@@ -58,11 +272,34 @@ def _landing_to_ocr_payload(parsed: dict[str, Any]) -> dict[str, Any]:
     }
 
 
+@functools.lru_cache(maxsize=1)
 def _load_schema() -> dict[str, Any]:
-    return json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
+    # json.loads takes bytes (UTF-8 detected), skipping the separate decode.
+    return json.loads(SCHEMA_PATH.read_bytes())
+
+
+@functools.lru_cache(maxsize=1)
+def _schema_validator() -> Validator:
+    """Build the output-schema validator once (draft picked from ``$schema``)."""
+    schema = _load_schema()
+    validator_cls = validator_for(schema)
+    validator_cls.check_schema(schema)
+    return validator_cls(schema)
+
+
+def warm_schema_validator() -> None:
+    """Load the output schema and compile its validator ahead of the first request."""
+    _schema_validator()
 
 
 def _pick(d: dict[str, Any], *keys: str, default: Any = None) -> Any:
+    if type(d) is dict:
+        # One hash lookup per key instead of a membership test plus an index.
+        for key in keys:
+            value = d.get(key)
+            if value is not None:
+                return value
+        return default
     for key in keys:
         if key in d and d[key] is not None:
             return d[key]
@@ -73,7 +310,13 @@ def _is_unknown(value: Any) -> bool:
     if value is None:
         return True
     if isinstance(value, str):
-        return value.strip().lower() in {"", "unknown", "na", "n/a", "not available", "none", "nil"}
+        if not value:
+            return True
+        # Anything longer than the longest sentinel with nothing to strip is
+        # real text; skip building the stripped, lowercased copy.
+        if len(value) > _UNKNOWN_MAX_LEN and not value[0].isspace() and not value[-1].isspace():
+            return False
+        return value.strip().lower() in _UNKNOWN_VALUES
     return False
 
 
@@ -87,16 +330,85 @@ def _first_known(*values: Any, default: Any = None) -> Any:
 def _clean_text(text: str) -> str:
     if not text:
         return ""
-    no_tags = re.sub(r"<[^>]+>", " ", text)
-    unescaped = html.unescape(no_tags)
-    return re.sub(r"\s+", " ", unescaped).strip()
+    if "<" in text:
+        text = _TAG_RE.sub(" ", text)
+    if "&" in text:
+        text = html.unescape(text)
+    # str.split() splits on the same characters as \s and drops the ends
+    return " ".join(text.split())
+
+
+def _parse_dmy(value: str, allow_short_year: bool = True) -> date | None:
+    """Fast path for ``%d/%m/%Y`` (and ``%d/%m/%y``); None if the shape differs."""
+    parts = value.split("/")
+    if len(parts) != 3:
+        return None
+    day, month, year = parts
+    if not (0 < len(day) <= 2 and 0 < len(month) <= 2 and (day + month + year).isdigit()):
+        return None
+    if len(year) == 4:
+        return date(int(year), int(month), int(day))
+    if len(year) == 2 and allow_short_year:
+        short_year = int(year)
+        # Same pivot as strptime's %y.
+        return date(short_year + (2000 if short_year < 69 else 1900), int(month), int(day))
+    return None
+
+
+def _parse_date_fast(value: str) -> date | None:
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        year, month, day = value[:4], value[5:7], value[8:10]
+        if (year + month + day).isdigit():
+            return date(int(year), int(month), int(day))
+        return None
+    return _parse_dmy(value)
+
+
+def _parse_datetime_fast(value: str) -> datetime | None:
+    if len(value) in (16, 19) and value[4] == "-" and value[7] == "-" and value[13] == ":":
+        separator = value[10]
+        if separator != " " and not (separator == "T" and len(value) == 19):
+            return None
+        second = "00"
+        if len(value) == 19:
+            if value[16] != ":":
+                return None
+            second = value[17:]
+        fields = (value[:4], value[5:7], value[8:10], value[11:13], value[14:16], second)
+        if not "".join(fields).isdigit():
+            return None
+        return datetime(*(int(field) for field in fields))
+
+    date_part, _, time_part = value.partition(" ")
+    parsed = _parse_dmy(date_part, allow_short_year=not time_part)
+    if parsed is None:
+        return None
+    if not time_part:
+        return datetime(parsed.year, parsed.month, parsed.day, 12)
+    hour, separator, minute = time_part.partition(":")
+    if separator and 0 < len(hour) <= 2 and 0 < len(minute) <= 2 and (hour + minute).isdigit():
+        return datetime(parsed.year, parsed.month, parsed.day, int(hour), int(minute))
+    return None
 
 
 def _parse_date(value: Any) -> str | None:
     if not value or not isinstance(value, str):
         return None
-    value = value.strip()
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%m/%d/%Y"):
+    return _parse_date_text(value.strip())
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date_text(value: str) -> str | None:
+    # strptime is slow; handle the usual shapes by hand and keep the format
+    # loop for anything the fast path rejects (including invalid dates).
+    if value.isascii():
+        try:
+            parsed = _parse_date_fast(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            return parsed.isoformat()
+    for fmt in _DATE_FORMATS:
         try:
             return datetime.strptime(value, fmt).date().isoformat()
         except ValueError:
@@ -107,18 +419,22 @@ def _parse_date(value: Any) -> str | None:
 def _parse_datetime(value: Any) -> str | None:
     if not value or not isinstance(value, str):
         return None
-    value = value.strip()
-    for fmt in (
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%d/%m/%Y %H:%M",
-        "%d/%m/%Y",
-        "%d/%m/%y",
-    ):
+    return _parse_datetime_text(value.strip())
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_datetime_text(value: str) -> str | None:
+    if value.isascii():
+        try:
+            parsed = _parse_datetime_fast(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None:
+            return parsed.isoformat()
+    for fmt in _DATETIME_FORMATS:
         try:
             dt = datetime.strptime(value, fmt)
-            if fmt in ("%d/%m/%Y", "%d/%m/%y"):
+            if fmt in _DATE_ONLY_DATETIME_FORMATS:
                 dt = dt.replace(hour=12, minute=0, second=0)
             return dt.isoformat()
         except ValueError:
@@ -131,40 +447,72 @@ def _extract_first_date(text: str) -> str | None:
     return match.group(1) if match else None
 
 
+@functools.lru_cache(maxsize=256)
 def _normalize_route(route_text: str) -> str:
     upper = route_text.upper()
-    if "ORAL" in upper:
-        return "ORAL"
-    if "IV" in upper:
-        return "IV"
-    if "IM" in upper:
-        return "IM"
-    if "SC" in upper or "SUBCUT" in upper:
-        return "SC"
-    if "INHAL" in upper or "NEB" in upper:
-        return "INHALATION"
-    if "TOPICAL" in upper:
-        return "TOPICAL"
+    for token, route in _ROUTE_TOKENS:
+        if token in upper:
+            return route
     return route_text or "unknown"
 
 
-def _extract_medications_from_markdown(markdown: str) -> list[dict[str, str]]:
-    meds: list[dict[str, str]] = []
-    row_pattern = re.compile(
-        r"<tr><td[^>]*>\s*\d+\s*</td><td[^>]*>(.*?)</td><td[^>]*>(.*?)</td><td[^>]*>(.*?)</td><td[^>]*>(.*?)</td>(?:<td[^>]*>.*?</td>){0,3}</tr>",
-        re.IGNORECASE | re.DOTALL,
-    )
+def _ascii_upper(text: str) -> str:
+    """Uppercase ``text`` as an IGNORECASE match would see it, keeping offsets aligned."""
+    return text.upper() if text.isascii() else text.translate(_ASCII_UPPER)
+
+
+def _search_from_marker(
+    pattern: re.Pattern[str],
+    upper: str,
+    marker_positions: dict[str, int],
+    marker: str,
+) -> re.Match[str] | None:
+    """Search ``upper`` starting at the first occurrence of the pattern's literal prefix.
+
+    ``marker`` is the uppercased literal the pattern starts with, looked up in
+    the index built by ``_index_markers``. No match can begin before the
+    marker, so the regex engine skips the preceding text instead of trying
+    every offset.
+    """
+    start = marker_positions[marker]
+    if start < 0:
+        return None
+    return pattern.search(upper, start)
+
+
+def _span_text(md: str, match: re.Match[str], group: int = 1) -> str:
+    """Return ``group`` of a match made on the uppercased copy, in the original case."""
+    start, end = match.span(group)
+    return md[start:end]
+
+
+def _index_markers(upper: str) -> dict[str, int]:
+    return {marker: upper.find(marker) for marker in _HEURISTIC_MARKERS}
+
+
+def _has_med_token(upper_name: str) -> bool:
+    return any(token in upper_name for token in _MED_TOKENS)
 
-    for match in row_pattern.finditer(markdown):
-        name = _clean_text(match.group(1))
-        dose = _clean_text(match.group(2))
-        frequency = _clean_text(match.group(3))
-        route_raw = _clean_text(match.group(4))
 
-        upper_name = name.upper()
-        if not any(token in upper_name for token in ("TAB", "CAP", "INJ", "SYP", "SYRUP", "DROP", "OINT")):
+def _extract_medications_from_markdown(markdown: str, upper: str | None = None) -> list[dict[str, str]]:
+    if upper is None:
+        upper = _ascii_upper(markdown)
+    meds: list[dict[str, str]] = []
+    for match in _MED_ROW_RE.finditer(upper):
+        raw_name = _span_text(markdown, match, 1)
+        # Cleaning only strips tags and whitespace, so a row whose raw name has
+        # no token (and no entity that could decode into one) can be skipped.
+        if "&" not in raw_name and not _has_med_token(raw_name.upper()):
+            continue
+
+        name = _clean_text(raw_name)
+        if not _has_med_token(name.upper()):
             continue
 
+        dose = _clean_text(_span_text(markdown, match, 2))
+        frequency = _clean_text(_span_text(markdown, match, 3))
+        route_raw = _clean_text(_span_text(markdown, match, 4))
+
         meds.append(
             {
                 "medication_name": name or "unknown",
@@ -190,159 +538,140 @@ def _extract_markdown_heuristics(markdown: str) -> dict[str, Any]:
         "medications": [],
     }
 
-    if "THE MADRAS MEDICAL MISSION" in md.upper():
-        heuristics["encounter"]["facility_name"] = "THE MADRAS MEDICAL MISSION"
+    patient = heuristics["patient"]
+    encounter = heuristics["encounter"]
+    clinical = heuristics["clinical_episode"]
+    follow_up = heuristics["follow_up"]
+    advice = heuristics["advice"]
+
+    upper = _ascii_upper(md)
+    markers = _index_markers(upper)
+    if "THE MADRAS MEDICAL MISSION" in upper:
+        encounter["facility_name"] = "THE MADRAS MEDICAL MISSION"
 
-    mrn_match = re.search(r"\bUHID\s*[:\-]\s*([A-Z0-9]+)", md, flags=re.IGNORECASE)
+    mrn_match = _search_from_marker(_MRN_RE, upper, markers, "UHID")
     if mrn_match:
-        heuristics["patient"]["mrn"] = mrn_match.group(1).strip()
+        patient["mrn"] = _span_text(md, mrn_match).strip()
 
-    name_match = re.search(r"\bNAME\s*[:\-]\s*([A-Z][A-Z\.\s]+)", md, flags=re.IGNORECASE)
+    name_match = _search_from_marker(_NAME_RE, upper, markers, "NAME")
     if name_match:
-        heuristics["patient"]["full_name"] = _clean_text(name_match.group(1))
+        patient["full_name"] = _clean_text(_span_text(md, name_match))
 
-    ip_match = re.search(r"\bIP\s*NO\.?\s*[:\-]\s*([A-Z0-9]+)", md, flags=re.IGNORECASE)
+    ip_match = _search_from_marker(_IP_NO_RE, upper, markers, "IP")
     if ip_match:
-        heuristics["patient"]["ip_no"] = ip_match.group(1).strip()
+        patient["ip_no"] = _span_text(md, ip_match).strip()
 
-    phone_match = re.search(r"\bPHONE\s*NO\.?\s*[:\-]\s*([0-9+\-\s]{8,20})", md, flags=re.IGNORECASE)
+    phone_match = _search_from_marker(_PHONE_RE, upper, markers, "PHONE")
     if phone_match:
-        heuristics["patient"]["phone"] = _clean_text(phone_match.group(1))
+        patient["phone"] = _clean_text(_span_text(md, phone_match))
 
-    address_match = re.search(r"\bADDRESS\s*[:\-]\s*(.+?)\s*(?:</td>|\\n<tr>|\\n<a id=)", md, flags=re.IGNORECASE | re.DOTALL)
+    address_match = _search_from_marker(_ADDRESS_RE, upper, markers, "ADDRESS")
     if address_match:
-        heuristics["patient"]["address"] = _clean_text(address_match.group(1))
+        patient["address"] = _clean_text(_span_text(md, address_match))
 
-    sex_match = re.search(r"\((\d+)\s*Years\s*/\s*([MF])\)", md, flags=re.IGNORECASE)
+    sex_match = _AGE_SEX_RE.search(upper)
     if sex_match:
-        heuristics["patient"]["sex_at_birth"] = "male" if sex_match.group(2).upper() == "M" else "female"
-        heuristics["patient"]["age_years"] = int(sex_match.group(1))
+        patient["sex_at_birth"] = "male" if sex_match.group(2) == "M" else "female"
+        patient["age_years"] = int(sex_match.group(1))
 
-    doa_match = re.search(
-        r"\bDOA\b\s*:?\s*(?:</td>\s*<td[^>]*>)?\s*(\d{1,2}/\d{1,2}/\d{2,4})",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    doa_match = _search_from_marker(_DOA_RE, upper, markers, "DOA")
     if doa_match:
-        heuristics["encounter"]["admission_date"] = doa_match.group(1)
+        encounter["admission_date"] = doa_match.group(1)
 
-    dod_match = re.search(
-        r"\bDOD\b\s*:?\s*(?:</td>\s*<td[^>]*>)?\s*(\d{1,2}/\d{1,2}/\d{2,4})",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    dod_match = _search_from_marker(_DOD_RE, upper, markers, "DOD")
     if dod_match:
-        heuristics["encounter"]["discharge_date"] = dod_match.group(1)
+        encounter["discharge_date"] = dod_match.group(1)
 
-    diag_block_match = re.search(
-        r"\*\*DIAGNOSIS\s*:\*\*(.*?)(?:\n<a id=|<!-- PAGE BREAK -->|BRIEF HISTORY|COURSE IN THE HOSPITAL)",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    diag_block_match = _search_from_marker(_DIAGNOSIS_BLOCK_RE, upper, markers, "**DIAGNOSIS")
     diagnosis_items: list[str] = []
     if diag_block_match:
-        diagnosis_items = [_clean_text(x) for x in re.findall(r"^\s*\*\s*(.+)$", diag_block_match.group(1), flags=re.MULTILINE)]
+        diagnosis_items = [_clean_text(x) for x in _BULLET_RE.findall(_span_text(md, diag_block_match))]
         diagnosis_items = [x for x in diagnosis_items if x]
 
     if diagnosis_items:
-        heuristics["clinical_episode"]["diagnoses"] = diagnosis_items
-        heuristics["clinical_episode"]["primary_diagnosis"] = diagnosis_items[0]
-        lvef_diag_match = re.search(r"EF\s*[-:=]?\s*(\d{1,2}(?:\.\d+)?)\s*%", " ".join(diagnosis_items), flags=re.IGNORECASE)
+        clinical["diagnoses"] = diagnosis_items
+        clinical["primary_diagnosis"] = diagnosis_items[0]
+        lvef_diag_match = _LVEF_RE.search(" ".join(diagnosis_items))
         if lvef_diag_match:
-            heuristics["clinical_episode"]["lvef_percent"] = float(lvef_diag_match.group(1))
+            clinical["lvef_percent"] = float(lvef_diag_match.group(1))
 
-    brief_history_match = re.search(
-        r"BRIEF HISTORY\s*:\s*(.*?)(?:\n<a id=|O/E:|S/E|INVESTIGATIONS|COURSE IN THE HOSPITAL)",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    brief_history_match = _search_from_marker(_BRIEF_HISTORY_RE, upper, markers, "BRIEF HISTORY")
     if brief_history_match:
-        heuristics["clinical_episode"]["reason_for_hospitalization"] = _clean_text(brief_history_match.group(1))
+        clinical["reason_for_hospitalization"] = _clean_text(_span_text(md, brief_history_match))
 
-    course_match = re.search(
-        r"COURSE IN THE HOSPITAL\s*:\s*(.*?)(?:\n<a id=|<table id=\"5-1\"|PRESCRIPTION DETAILS|ADVICE ON DISCHARGE)",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    course_match = _search_from_marker(_COURSE_RE, upper, markers, "COURSE IN THE HOSPITAL")
     if course_match:
-        heuristics["clinical_episode"]["hospital_course_summary"] = _clean_text(course_match.group(1))
+        clinical["hospital_course_summary"] = _clean_text(_span_text(md, course_match))
 
-    past_history_match = re.search(
-        r"NAME:\s*[A-Z\.\s]+</a>\s*(.*?)\s*<a id='[^']+'></a>\s*PLAN\s*:",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    past_history_match = _search_from_marker(_PAST_HISTORY_RE, upper, markers, "NAME:")
     if past_history_match:
-        history_lines = [_clean_text(x) for x in past_history_match.group(1).splitlines() if _clean_text(x)]
+        history_lines = [_clean_text(x) for x in _span_text(md, past_history_match).splitlines() if _clean_text(x)]
         if history_lines:
-            heuristics["clinical_episode"]["past_history"] = history_lines
+            clinical["past_history"] = history_lines
 
-    echo_match = re.search(r"ECHO\s*\((\d{1,2}/\d{1,2}/\d{2,4})\)\s*:(.*?)(?:\n<a id=|COURSE IN THE HOSPITAL)", md, flags=re.IGNORECASE | re.DOTALL)
+    echo_match = _search_from_marker(_ECHO_RE, upper, markers, "ECHO")
     if echo_match:
-        echo_text = _clean_text(echo_match.group(2))
-        heuristics["clinical_episode"]["echo_date"] = echo_match.group(1)
-        heuristics["clinical_episode"]["echo_summary"] = echo_text
-        lvef_echo_match = re.search(r"EF\s*[-:=]?\s*(\d{1,2}(?:\.\d+)?)\s*%", echo_text, flags=re.IGNORECASE)
+        echo_text = _clean_text(_span_text(md, echo_match, 2))
+        clinical["echo_date"] = echo_match.group(1)
+        clinical["echo_summary"] = echo_text
+        lvef_echo_match = _LVEF_RE.search(echo_text)
         if lvef_echo_match:
-            heuristics["clinical_episode"]["lvef_percent"] = float(lvef_echo_match.group(1))
+            clinical["lvef_percent"] = float(lvef_echo_match.group(1))
 
-    followup_cell_match = re.search(r"FOLLOW\s*UP</td><td[^>]*>(.*?)</td>", md, flags=re.IGNORECASE | re.DOTALL)
-    followup_text = _clean_text(followup_cell_match.group(1)) if followup_cell_match else ""
+    followup_cell_match = _search_from_marker(_FOLLOWUP_CELL_RE, upper, markers, "FOLLOW")
+    followup_text = _clean_text(_span_text(md, followup_cell_match)) if followup_cell_match else ""
     if not followup_text:
-        followup_line_match = re.search(r"(REVIEW\s+WITH\s+DR\.?[^<\n]{10,300})", md, flags=re.IGNORECASE)
+        followup_line_match = _search_from_marker(_FOLLOWUP_LINE_RE, upper, markers, "REVIEW")
         if followup_line_match:
-            followup_text = _clean_text(followup_line_match.group(1))
+            followup_text = _clean_text(_span_text(md, followup_line_match))
 
     if followup_text:
-        heuristics["follow_up"]["text"] = followup_text
+        follow_up["text"] = followup_text
         followup_date = _extract_first_date(followup_text)
         if followup_date:
-            heuristics["follow_up"]["date"] = followup_date
+            follow_up["date"] = followup_date
 
-        doctor_match = re.search(
-            r"REVIEW\s+WITH\s+DR\.?\s*([A-Z][A-Z\.\s]+?)(?:\s+ON\b|\s*,|\s+IN\b)",
-            followup_text,
-            flags=re.IGNORECASE,
-        )
+        doctor_match = _FOLLOWUP_DOCTOR_RE.search(followup_text)
         if doctor_match:
-            heuristics["follow_up"]["doctor"] = _clean_text(doctor_match.group(1))
+            follow_up["doctor"] = _clean_text(doctor_match.group(1))
 
         upper_follow = followup_text.upper()
         if "REPORTS" in upper_follow and "WITH" in upper_follow:
             pre_reports = followup_text[: upper_follow.rfind("REPORTS")]
             test_chunk = pre_reports.rsplit("WITH", 1)[-1]
-            tests = [t.strip(" .") for t in re.split(r",|/|\\bAND\\b", test_chunk, flags=re.IGNORECASE) if t.strip(" .")]
+            tests = [t.strip(" .") for t in _TEST_SPLIT_RE.split(test_chunk) if t.strip(" .")]
             if tests:
-                heuristics["follow_up"]["required_tests"] = tests
+                follow_up["required_tests"] = tests
 
-    if "doctor" not in heuristics["follow_up"]:
-        signature_doc_match = re.search(r"DR\.\s*([A-Z\.\s]+),", md, flags=re.IGNORECASE)
+    if "doctor" not in follow_up:
+        signature_doc_match = _search_from_marker(_SIGNATURE_DOCTOR_RE, upper, markers, "DR.")
         if signature_doc_match:
-            heuristics["follow_up"]["doctor"] = _clean_text(signature_doc_match.group(1))
+            follow_up["doctor"] = _clean_text(_span_text(md, signature_doc_match))
 
-    diet_match = re.search(r"DIET</td><td[^>]*>(.*?)</td>", md, flags=re.IGNORECASE | re.DOTALL)
+    diet_match = _search_from_marker(_DIET_RE, upper, markers, "DIET</TD>")
     if diet_match:
-        heuristics["advice"]["diet"] = _clean_text(diet_match.group(1))
+        advice["diet"] = _clean_text(_span_text(md, diet_match))
 
-    fluid_match = re.search(
-        r"RESTRICTED FLUID.*?</td><td[^>]*>(.*?)</td>",
-        md,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
+    fluid_match = _search_from_marker(_FLUID_RE, upper, markers, "RESTRICTED FLUID")
     if fluid_match:
-        heuristics["advice"]["fluid"] = _clean_text(fluid_match.group(1))
+        advice["fluid"] = _clean_text(_span_text(md, fluid_match))
 
-    activity_match = re.search(r"PHYSICAL ACTIVITY</td><td[^>]*>(.*?)</td>", md, flags=re.IGNORECASE | re.DOTALL)
+    activity_match = _search_from_marker(_ACTIVITY_RE, upper, markers, "PHYSICAL ACTIVITY</TD>")
     if activity_match:
-        heuristics["advice"]["activity"] = _clean_text(activity_match.group(1))
+        advice["activity"] = _clean_text(_span_text(md, activity_match))
 
-    emergency_table_match = re.search(r"<table id=\"7-1\">(.*?)</table>", md, flags=re.IGNORECASE | re.DOTALL)
+    emergency_table_match = _search_from_marker(_EMERGENCY_TABLE_RE, upper, markers, '<TABLE ID="7-1">')
     if emergency_table_match:
-        first_col_items = re.findall(r"<tr><td[^>]*>(.*?)</td><td[^>]*>", emergency_table_match.group(1), flags=re.IGNORECASE | re.DOTALL)
-        cleaned = [_clean_text(x) for x in first_col_items]
-        heuristics["emergency_signs"] = [x for x in cleaned if x and "Please call in case" not in x and "appointment" not in x.lower()]
-
-    heuristics["medications"] = _extract_medications_from_markdown(md)
+        table_start, table_end = emergency_table_match.span(1)
+        emergency_signs: list[str] = []
+        for row in _EMERGENCY_ROW_RE.finditer(upper, table_start, table_end):
+            sign = _clean_text(_span_text(md, row))
+            # Cheap case-sensitive test first; lowercase only the rows that pass it.
+            if sign and "Please call in case" not in sign and "appointment" not in sign.lower():
+                emergency_signs.append(sign)
+        heuristics["emergency_signs"] = emergency_signs
+
+    heuristics["medications"] = _extract_medications_from_markdown(md, upper)
     return heuristics
 
 
@@ -359,25 +688,28 @@ def _detect_chf_classification(diagnosis_texts: list[str]) -> str:
     return "unknown"
 
 
+def _normalized_med_name(value: str) -> str:
+    # Non-ASCII characters fall out at encode time, the rest in one translate pass.
+    return (value or "").lower().encode("ascii", "ignore").translate(None, _NON_ALNUM_BYTES).decode("ascii")
+
+
 def _normalize_medication_rows(raw_rows: list[Any], heuristic_rows: list[dict[str, str]]) -> list[dict[str, str]]:
-    def normalized_med_name(value: str) -> str:
-        return re.sub(r"[^a-z0-9]+", "", (value or "").strip().lower())
+    def keyed(rows: list[dict[str, str]]) -> list[tuple[dict[str, str], str]]:
+        return [(row, _normalized_med_name(str(row.get("medication_name", "")))) for row in rows]
 
     def merge_indications(
-        base_rows: list[dict[str, str]],
-        source_rows: list[dict[str, str]],
+        base_rows: list[tuple[dict[str, str], str]],
+        source_rows: list[tuple[dict[str, str], str]],
     ) -> list[dict[str, str]]:
         source_map: dict[str, str] = {}
-        for row in source_rows:
-            name_key = normalized_med_name(str(row.get("medication_name", "")))
+        for row, name_key in source_rows:
             indication = str(row.get("indication", "")).strip()
             if name_key and not _is_unknown(indication):
                 source_map[name_key] = indication
 
         merged: list[dict[str, str]] = []
-        for row in base_rows:
+        for row, name_key in base_rows:
             out = dict(row)
-            name_key = normalized_med_name(str(out.get("medication_name", "")))
             if name_key and _is_unknown(out.get("indication")) and name_key in source_map:
                 out["indication"] = source_map[name_key]
             merged.append(out)
@@ -410,10 +742,10 @@ def _normalize_medication_rows(raw_rows: list[Any], heuristic_rows: list[dict[st
             unknown_rows += 1
 
     if heuristic_rows and (unknown_rows > 0 or len(heuristic_rows) > len(normalized_raw)):
-        return merge_indications(heuristic_rows, normalized_raw)
+        return merge_indications(keyed(heuristic_rows), keyed(normalized_raw))
 
     if normalized_raw:
-        return merge_indications(normalized_raw, heuristic_rows)
+        return merge_indications(keyed(normalized_raw), keyed(heuristic_rows))
 
     return [{
         "medication_name": "unknown",
@@ -433,6 +765,8 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
     follow = raw.get("follow_up", {}) if isinstance(raw.get("follow_up"), dict) else {}
     poc = raw.get("plan_of_care", {}) if isinstance(raw.get("plan_of_care"), dict) else {}
     discharge_info = raw.get("discharge_information", {}) if isinstance(raw.get("discharge_information"), dict) else {}
+    raw_encounter = raw.get("encounter", {})
+    raw_source = raw.get("source_document", {})
 
     heuristic_patient = heuristics.get("patient", {}) if isinstance(heuristics.get("patient"), dict) else {}
     heuristic_encounter = heuristics.get("encounter", {}) if isinstance(heuristics.get("encounter"), dict) else {}
@@ -475,8 +809,8 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
     diag_list = [x for x in diag_list if not _is_unknown(x)]
     primary_diag = diag_list[0] if diag_list else "unknown"
 
-    raw_admit = _pick(raw.get("encounter", {}), "admission_datetime", default=None)
-    raw_discharge = _pick(raw.get("encounter", {}), "discharge_datetime", default=None)
+    raw_admit = _pick(raw_encounter, "admission_datetime", default=None)
+    raw_discharge = _pick(raw_encounter, "discharge_datetime", default=None)
     admit_dt = _parse_datetime(raw_admit)
     discharge_dt = _parse_datetime(raw_discharge)
 
@@ -593,13 +927,18 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
     else:
         lvef_percent = None
 
+    # Every entry is a distinct path, so plain appends keep the list unique.
+    soft_missing.append("follow_up.care_coordinator.phone")
+    if lvef_percent is None:
+        soft_missing.append("clinical_modules.chf.hf_phenotype.latest_lvef_percent")
+
     output = {
         "schema_version": "1.0.0",
         "source_document": {
             "file_name": pdf_name,
-            "page_count": int(_pick(raw.get("source_document", {}), "page_count", default=_pick(ocr, "page_count", default=1))),
-            "ocr_quality_score": float(_pick(raw.get("source_document", {}), "ocr_quality_score", default=_pick(ocr, "ocr_quality_score", default=0.5))),
-            "illegible_sections": list(_pick(raw.get("source_document", {}), "illegible_sections", default=_pick(ocr, "illegible_sections", default=[]))),
+            "page_count": int(_pick(raw_source, "page_count", default=_pick(ocr, "page_count", default=1))),
+            "ocr_quality_score": float(_pick(raw_source, "ocr_quality_score", default=_pick(ocr, "ocr_quality_score", default=0.5))),
+            "illegible_sections": list(_pick(raw_source, "illegible_sections", default=_pick(ocr, "illegible_sections", default=[]))),
         },
         "patient": {
             "full_name": str(patient_name),
@@ -609,11 +948,11 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
         },
         "encounter": {
             "facility_name": str(
-                _first_known(_pick(raw.get("encounter", {}), "facility_name", default=None), heuristic_encounter.get("facility_name"), default="unknown facility")
+                _first_known(_pick(raw_encounter, "facility_name", default=None), heuristic_encounter.get("facility_name"), default="unknown facility")
             ),
             "admission_datetime": admit_dt,
             "discharge_datetime": discharge_dt,
-            "disposition": str(_pick(raw.get("encounter", {}), "disposition", default="home")).strip().lower().replace(" ", "_"),
+            "disposition": str(_pick(raw_encounter, "disposition", default="home")).strip().lower().replace(" ", "_"),
         },
         "clinical_episode": {
             "reason_for_hospitalization": str(reason_for_hospitalization),
@@ -732,13 +1071,7 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
         "validation": {
             "hard_stop_complete": len(missing_hard) == 0,
             "hard_stop_missing_fields": missing_hard,
-            "soft_stop_missing_fields": list(dict.fromkeys(
-                soft_missing
-                + [
-                    "follow_up.care_coordinator.phone",
-                ]
-                + (["clinical_modules.chf.hf_phenotype.latest_lvef_percent"] if lvef_percent is None else [])
-            )),
+            "soft_stop_missing_fields": soft_missing,
             "ready_for_patient_app": len(missing_hard) == 0 and not _is_unknown(primary_diag) and followup_datetime is not None,
         },
     }
@@ -746,19 +1079,7 @@ def _normalize_to_schema(raw: dict[str, Any], ocr: dict[str, Any], pdf_name: str
     return output
 
 
-def _enrich_medication_indications_with_gemini(
-    extracted: dict[str, Any],
-    gemini_client: GeminiClient,
-    json_model: str,
-) -> dict[str, Any]:
-    meds_container = extracted.get("medications", {})
-    if not isinstance(meds_container, dict):
-        return extracted
-
-    meds = meds_container.get("discharge_medications", [])
-    if not isinstance(meds, list) or not meds:
-        return extracted
-
+def _indication_targets(meds: list[Any]) -> list[dict[str, Any]]:
     targets: list[dict[str, Any]] = []
     for idx, med in enumerate(meds):
         if not isinstance(med, dict):
@@ -771,18 +1092,103 @@ def _enrich_medication_indications_with_gemini(
                     "row_index": idx,
                     "medication_name": med.get("medication_name"),
                     "dose": med.get("dose"),
-                    "route": med.get("route"),
                     "frequency": med.get("frequency"),
                 }
             )
+    return targets
 
-    if not targets:
-        return extracted
 
-    clinical = extracted.get("clinical_episode", {}) if isinstance(extracted.get("clinical_episode"), dict) else {}
+def _indication_hint(medication_name: str) -> str | None:
+    """Look up the first word of the name that is not a dosage form."""
+    for word in _WORD_RE.findall(medication_name.lower()):
+        if word not in _DOSAGE_FORM_WORDS:
+            return _INDICATION_HINTS.get(word)
+    return None
+
+
+def _infer_indications(
+    gemini_client: GeminiClient,
+    json_model: str,
+    targets: list[dict[str, Any]],
+    clinical: dict[str, Any],
+) -> dict[int, str]:
+    """Return ``{row_index: indication}`` for the target rows.
+
+    Well-known drugs are answered from ``_INDICATION_HINTS`` and drugs seen in
+    earlier documents from ``_indication_cache``; only the rest are sent to
+    Gemini, and their answers are cached.
+    """
+    indications: dict[int, str] = {}
+    misses: list[dict[str, Any]] = []
+    miss_keys: dict[int, str] = {}
+    with _indication_cache_lock:
+        for target in targets:
+            hint = _indication_hint(str(target.get("medication_name", "")))
+            if hint:
+                indications[target["row_index"]] = hint
+                continue
+            name_key = _normalized_med_name(str(target.get("medication_name", "")))
+            cached = _indication_cache.get(name_key) if name_key else None
+            if cached is not None:
+                indications[target["row_index"]] = cached
+            else:
+                misses.append(target)
+                if name_key:
+                    miss_keys[target["row_index"]] = name_key
+    if not misses:
+        return indications
+
+    inferred = _request_indications(gemini_client, json_model, misses, clinical)
+    indications.update(inferred)
+    with _indication_cache_lock:
+        for row_index, indication in inferred.items():
+            name_key = miss_keys.get(row_index)
+            if name_key:
+                _indication_cache.pop(name_key, None)
+                _indication_cache[name_key] = indication
+        # Evict oldest entries (dicts keep insertion order)
+        while len(_indication_cache) > _INDICATION_CACHE_MAX:
+            del _indication_cache[next(iter(_indication_cache))]
+    return indications
+
+
+def _request_indications(
+    gemini_client: GeminiClient,
+    json_model: str,
+    targets: list[dict[str, Any]],
+    clinical: dict[str, Any],
+) -> dict[int, str]:
+    """Ask Gemini for the purpose of each target row.
+
+    Rows are sent ``_INDICATION_BATCH_SIZE`` per prompt; larger lists are split
+    and the batches requested concurrently.
+    """
+    batches = [targets[i : i + _INDICATION_BATCH_SIZE] for i in range(0, len(targets), _INDICATION_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return _infer_indication_batch(gemini_client, json_model, targets, clinical) if targets else {}
+
+    indications: dict[int, str] = {}
+    with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+        for result in executor.map(
+            lambda batch: _infer_indication_batch(gemini_client, json_model, batch, clinical),
+            batches,
+        ):
+            indications.update(result)
+    return indications
+
+
+def _infer_indication_batch(
+    gemini_client: GeminiClient,
+    json_model: str,
+    targets: list[dict[str, Any]],
+    clinical: dict[str, Any],
+) -> dict[int, str]:
+    secondary = clinical.get("secondary_diagnoses", [])
+    if isinstance(secondary, list):
+        secondary = secondary[:_INDICATION_CONTEXT_DIAGNOSES]
     context = {
         "primary_diagnosis": clinical.get("primary_diagnosis"),
-        "secondary_diagnoses": clinical.get("secondary_diagnoses", []),
+        "secondary_diagnoses": secondary,
         "reason_for_hospitalization": clinical.get("reason_for_hospitalization"),
         "medications_needing_purpose": targets,
     }
@@ -811,12 +1217,13 @@ Context:
             temperature=0.0,
         )
     except GeminiError:
-        return extracted
+        return {}
 
     items = inferred.get("items", [])
     if not isinstance(items, list):
-        return extracted
+        return {}
 
+    indications: dict[int, str] = {}
     for item in items:
         if not isinstance(item, dict):
             continue
@@ -824,33 +1231,67 @@ Context:
         indication = str(item.get("indication", "")).strip()
         if not isinstance(row_index, int):
             continue
-        if row_index < 0 or row_index >= len(meds):
-            continue
         if _is_unknown(indication):
             continue
-        if isinstance(meds[row_index], dict):
-            meds[row_index]["indication"] = indication
+        indications[row_index] = indication
+    return indications
 
-    return extracted
 
+def _apply_heuristic_indications(
+    extracted: dict[str, Any],
+    heuristic_meds: list[dict[str, str]],
+    indications: dict[int, str],
+) -> None:
+    """Copy indications inferred for the markdown rows onto matching output rows."""
+    by_name: dict[str, str] = {}
+    for row_index, indication in indications.items():
+        if 0 <= row_index < len(heuristic_meds):
+            name_key = _normalized_med_name(str(heuristic_meds[row_index].get("medication_name", "")))
+            if name_key:
+                by_name[name_key] = indication
+    if not by_name:
+        return
+
+    for med in extracted["medications"]["discharge_medications"]:
+        if not isinstance(med, dict) or not _is_unknown(med.get("indication")):
+            continue
+        name_key = _normalized_med_name(str(med.get("medication_name", "")))
+        if name_key in by_name:
+            med["indication"] = by_name[name_key]
 
-def run_extraction(
-    pdf_path: str,
-    model_ocr: str | None = None,
-    model_json: str | None = None,
-    api_key: str | None = None,
-    landing_api_key: str | None = None,
+
+def _enrich_medication_indications_with_gemini(
+    extracted: dict[str, Any],
+    gemini_client: GeminiClient,
+    json_model: str,
 ) -> dict[str, Any]:
-    pdf_file = Path(pdf_path)
-    if not pdf_file.exists():
-        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+    meds_container = extracted.get("medications", {})
+    if not isinstance(meds_container, dict):
+        return extracted
 
-    gemini_client = GeminiClient(api_key=api_key)
-    landing_client = LandingClient(api_key=landing_api_key)
-    raw_pdf = pdf_file.read_bytes()
+    meds = meds_container.get("discharge_medications", [])
+    if not isinstance(meds, list) or not meds:
+        return extracted
 
-    parse_model = model_ocr or settings.landing_parse_model or None
-    json_model = model_json or settings.gemini_json_model
+    targets = _indication_targets(meds)
+    if not targets:
+        return extracted
+
+    clinical = extracted.get("clinical_episode", {}) if isinstance(extracted.get("clinical_episode"), dict) else {}
+    for row_index, indication in _infer_indications(gemini_client, json_model, targets, clinical).items():
+        if 0 <= row_index < len(meds) and isinstance(meds[row_index], dict):
+            meds[row_index]["indication"] = indication
+
+    return extracted
+
+
+def _prepare_extraction(
+    pdf_file: Path,
+    landing_client: LandingClient,
+    parse_model: str | None,
+) -> tuple[dict[str, Any], dict[str, Any], str]:
+    """Parse the PDF with Landing.ai; returns (ocr payload, heuristics, extraction prompt)."""
+    raw_pdf = pdf_file.read_bytes()
 
     try:
         parsed = landing_client.parse_document(raw_pdf, filename=pdf_file.name, model=parse_model)
@@ -859,7 +1300,7 @@ def run_extraction(
 
     ocr_result = _landing_to_ocr_payload(parsed)
     parsed_markdown = str(parsed.get("markdown", "") or "")
-    markdown_for_prompt = parsed_markdown[:120000]
+    markdown_for_prompt = _PROMPT_ID_RE.sub("", parsed_markdown[:120000])
     heuristics = _extract_markdown_heuristics(parsed_markdown)
 
     extraction_user_prompt = f"""
@@ -885,29 +1326,161 @@ Try to include keys aligned with this structure:
 - clinical_modules
 """.strip()
 
-    extracted_raw: dict[str, Any]
-    llm_failed = False
-    try:
-        extracted_raw = gemini_client.generate_json(
-            model=json_model,
-            system_prompt=EXTRACTION_SYSTEM_PROMPT,
-            user_prompt=extraction_user_prompt,
-            temperature=0.1,
-        )
-    except GeminiError:
-        # Keep pipeline resilient: deterministic parser still builds a high-quality baseline.
-        extracted_raw = {}
-        llm_failed = True
+    return ocr_result, heuristics, extraction_user_prompt
+
 
-    extracted = _normalize_to_schema(extracted_raw, ocr_result, pdf_file.name, heuristics)
+def _finalize_extraction(
+    extracted_raw: dict[str, Any],
+    llm_failed: bool,
+    ocr_result: dict[str, Any],
+    pdf_name: str,
+    heuristics: dict[str, Any],
+    gemini_client: GeminiClient,
+    json_model: str,
+    heuristic_indications: dict[int, str] | None = None,
+) -> dict[str, Any]:
+    """Normalise the model output, fill medication indications and validate."""
+    extracted = _normalize_to_schema(extracted_raw, ocr_result, pdf_name, heuristics)
+    if heuristic_indications:
+        _apply_heuristic_indications(extracted, heuristics["medications"], heuristic_indications)
     extracted = _enrich_medication_indications_with_gemini(extracted, gemini_client, json_model)
     if llm_failed:
         extracted["validation"]["soft_stop_missing_fields"].append("llm.extraction_fallback_used")
 
-    schema = _load_schema()
-    try:
-        validate(instance=extracted, schema=schema)
-    except ValidationError as exc:
-        raise GeminiError(f"Extracted JSON failed schema validation: {exc.message}") from exc
+    error = best_match(_schema_validator().iter_errors(extracted))
+    if error is not None:
+        raise GeminiError(f"Extracted JSON failed schema validation: {error.message}") from error
 
     return extracted
+
+
+def run_extraction(
+    pdf_path: str,
+    model_ocr: str | None = None,
+    model_json: str | None = None,
+    api_key: str | None = None,
+    landing_api_key: str | None = None,
+) -> dict[str, Any]:
+    pdf_file = Path(pdf_path)
+    if not pdf_file.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    gemini_client = GeminiClient(api_key=api_key)
+    landing_client = LandingClient(api_key=landing_api_key)
+
+    parse_model = model_ocr or settings.landing_parse_model or None
+    json_model = model_json or settings.gemini_json_model
+
+    ocr_result, heuristics, extraction_user_prompt = _prepare_extraction(pdf_file, landing_client, parse_model)
+
+    # The markdown medication rows are already known, so their indications can
+    # be inferred while the (much slower) extraction call is in flight. Only
+    # rows left unknown after that get a second, post-normalisation pass.
+    heuristic_clinical = heuristics["clinical_episode"]
+    indication_targets = _indication_targets(heuristics["medications"])
+
+    extracted_raw: dict[str, Any]
+    llm_failed = False
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        indication_future = None
+        if indication_targets:
+            indication_future = executor.submit(
+                _infer_indications,
+                gemini_client,
+                json_model,
+                indication_targets,
+                {
+                    "primary_diagnosis": heuristic_clinical.get("primary_diagnosis"),
+                    "secondary_diagnoses": heuristic_clinical.get("diagnoses", [])[1:],
+                    "reason_for_hospitalization": heuristic_clinical.get("reason_for_hospitalization"),
+                },
+            )
+        try:
+            extracted_raw = gemini_client.generate_json(
+                model=json_model,
+                system_prompt=EXTRACTION_SYSTEM_PROMPT,
+                user_prompt=extraction_user_prompt,
+                temperature=0.1,
+            )
+        except GeminiError:
+            # Keep pipeline resilient: deterministic parser still builds a high-quality baseline.
+            extracted_raw = {}
+            llm_failed = True
+        heuristic_indications = indication_future.result() if indication_future else {}
+
+    return _finalize_extraction(
+        extracted_raw,
+        llm_failed,
+        ocr_result,
+        pdf_file.name,
+        heuristics,
+        gemini_client,
+        json_model,
+        heuristic_indications,
+    )
+
+
+def run_batch_extraction(
+    pdf_paths: list[str],
+    model_ocr: str | None = None,
+    model_json: str | None = None,
+    api_key: str | None = None,
+    landing_api_key: str | None = None,
+    poll_interval: float = 30.0,
+    max_wait: float | None = None,
+) -> list[dict[str, Any] | Exception]:
+    """Extract many PDFs with one Gemini Batch Mode job for the extraction step.
+
+    Landing.ai parsing still runs per PDF (a few in parallel). Returns one
+    entry per input path, in order: the extraction dict, or the exception
+    that stopped that PDF.
+    """
+    gemini_client = GeminiClient(api_key=api_key)
+    landing_client = LandingClient(api_key=landing_api_key)
+
+    parse_model = model_ocr or settings.landing_parse_model or None
+    json_model = model_json or settings.gemini_json_model
+
+    def prepare(pdf_path: str) -> tuple[dict[str, Any], dict[str, Any], str] | Exception:
+        try:
+            return _prepare_extraction(Path(pdf_path), landing_client, parse_model)
+        except (OSError, GeminiError) as exc:
+            return exc
+
+    with ThreadPoolExecutor(max_workers=_BATCH_PARSE_WORKERS) as executor:
+        prepared = list(executor.map(prepare, pdf_paths))
+
+    pending = [i for i, item in enumerate(prepared) if not isinstance(item, Exception)]
+    responses: list[dict[str, Any] | GeminiError] = []
+    if pending:
+        try:
+            responses = gemini_client.batch_generate_json(
+                model=json_model,
+                system_prompt=EXTRACTION_SYSTEM_PROMPT,
+                user_prompts=[prepared[i][2] for i in pending],
+                temperature=0.1,
+                poll_interval=poll_interval,
+                max_wait=max_wait,
+            )
+        except GeminiError as exc:
+            # The job itself failed; keep the paid-for parses and fall back to
+            # heuristics for every document, as run_extraction does.
+            responses = [exc] * len(pending)
+
+    results: list[dict[str, Any] | Exception] = list(prepared)
+    for i, response in zip(pending, responses):
+        ocr_result, heuristics, _ = prepared[i]
+        llm_failed = isinstance(response, GeminiError)
+        try:
+            results[i] = _finalize_extraction(
+                {} if llm_failed else response,
+                llm_failed,
+                ocr_result,
+                Path(pdf_paths[i]).name,
+                heuristics,
+                gemini_client,
+                json_model,
+            )
+        except GeminiError as exc:
+            results[i] = exc
+    return results
@@ -7,12 +7,15 @@ monitoring schedules, appointment reminders, and nurse check-ins.
 
 from __future__ import annotations
 
+import functools
 import logging
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Any
 
 from app import firestore_client as fdb
+from app.extraction_view import ExtractionView, as_view
+from app.notifications import render_notification_content
 
 logger = logging.getLogger(__name__)
 
@@ -22,47 +25,63 @@ logger = logging.getLogger(__name__)
 
 # Indian discharge summaries use notation like "1-0-1" meaning morning-afternoon-night
 # where 1 = take, 0 = skip. Also handles text frequencies.
-_FREQ_TIME_MAP: dict[str, list[str]] = {
+_FREQ_TIME_MAP: dict[str, tuple[str, ...]] = {
     # Pattern-based (1-0-1, 1-1-1, etc.)
-    "1-0-0": ["08:00"],
-    "0-1-0": ["14:00"],
-    "0-0-1": ["21:00"],
-    "1-1-0": ["08:00", "14:00"],
-    "1-0-1": ["08:00", "21:00"],
-    "0-1-1": ["14:00", "21:00"],
-    "1-1-1": ["08:00", "14:00", "21:00"],
-    "1-1-1-1": ["06:00", "12:00", "18:00", "22:00"],
+    "1-0-0": ("08:00",),
+    "0-1-0": ("14:00",),
+    "0-0-1": ("21:00",),
+    "1-1-0": ("08:00", "14:00"),
+    "1-0-1": ("08:00", "21:00"),
+    "0-1-1": ("14:00", "21:00"),
+    "1-1-1": ("08:00", "14:00", "21:00"),
+    "1-1-1-1": ("06:00", "12:00", "18:00", "22:00"),
     # Text-based
-    "once daily": ["08:00"],
-    "od": ["08:00"],
-    "once a day": ["08:00"],
-    "qd": ["08:00"],
-    "daily": ["08:00"],
-    "bd": ["08:00", "21:00"],
-    "bid": ["08:00", "21:00"],
-    "twice daily": ["08:00", "21:00"],
-    "twice a day": ["08:00", "21:00"],
-    "tds": ["08:00", "14:00", "21:00"],
-    "tid": ["08:00", "14:00", "21:00"],
-    "thrice daily": ["08:00", "14:00", "21:00"],
-    "three times a day": ["08:00", "14:00", "21:00"],
-    "qid": ["06:00", "12:00", "18:00", "22:00"],
-    "four times a day": ["06:00", "12:00", "18:00", "22:00"],
-    "at night": ["21:00"],
-    "hs": ["21:00"],
-    "at bedtime": ["21:00"],
-    "morning": ["08:00"],
-    "evening": ["18:00"],
-    "night": ["21:00"],
-    "sos": [],  # as needed — no scheduled reminder
-    "prn": [],  # as needed
-    "stat": [],  # one-time
-    "weekly": ["08:00"],  # weekly meds get a single daily time
+    "once daily": ("08:00",),
+    "od": ("08:00",),
+    "once a day": ("08:00",),
+    "qd": ("08:00",),
+    "daily": ("08:00",),
+    "bd": ("08:00", "21:00"),
+    "bid": ("08:00", "21:00"),
+    "twice daily": ("08:00", "21:00"),
+    "twice a day": ("08:00", "21:00"),
+    "tds": ("08:00", "14:00", "21:00"),
+    "tid": ("08:00", "14:00", "21:00"),
+    "thrice daily": ("08:00", "14:00", "21:00"),
+    "three times a day": ("08:00", "14:00", "21:00"),
+    "qid": ("06:00", "12:00", "18:00", "22:00"),
+    "four times a day": ("06:00", "12:00", "18:00", "22:00"),
+    "at night": ("21:00",),
+    "hs": ("21:00",),
+    "at bedtime": ("21:00",),
+    "morning": ("08:00",),
+    "evening": ("18:00",),
+    "night": ("21:00",),
+    "sos": (),  # as needed — no scheduled reminder
+    "prn": (),  # as needed
+    "stat": (),  # one-time
+    "weekly": ("08:00",),  # weekly meds get a single daily time
 }
 
+# "1-0-1" style dose pattern anywhere in the string (checked before keywords)
+_DOSE_PATTERN_RE = re.compile(r"\b([01]-[01]-[01](?:-[01])?)\b")
 
-def _parse_frequency_to_times(frequency: str) -> list[str]:
-    """Convert a medication frequency string into a list of scheduled times."""
+# All schedulable keys as one alternation, longest first so "twice daily"
+# wins over "daily". As-needed keys (no times) are left to the direct match.
+_FREQ_KEYWORD_RE = re.compile(
+    r"\b("
+    + "|".join(re.escape(key) for key in sorted((k for k, v in _FREQ_TIME_MAP.items() if v), key=len, reverse=True))
+    + r")\b"
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_frequency_to_times(frequency: str) -> tuple[str, ...]:
+    """Convert a medication frequency string into a tuple of scheduled times.
+
+    Cached: the same few frequency strings recur across medications, patients
+    and daily compliance runs (this also logs each unparseable string once).
+    """
     freq = (frequency or "").strip().lower()
 
     # Try direct match
@@ -70,46 +89,85 @@ def _parse_frequency_to_times(frequency: str) -> list[str]:
         return _FREQ_TIME_MAP[freq]
 
     # Try pattern match: look for "1-0-1" style inside the string
-    pattern_match = re.search(r"\b([01]-[01]-[01](?:-[01])?)\b", freq)
+    pattern_match = _DOSE_PATTERN_RE.search(freq)
     if pattern_match:
         pattern = pattern_match.group(1)
         if pattern in _FREQ_TIME_MAP:
             return _FREQ_TIME_MAP[pattern]
 
     # Keyword search in the string
-    freq_lower = freq.lower()
-    for key, times in _FREQ_TIME_MAP.items():
-        if key in freq_lower and times:
-            return times
+    keyword_match = _FREQ_KEYWORD_RE.search(freq)
+    if keyword_match:
+        return _FREQ_TIME_MAP[keyword_match.group(1)]
 
     # Default: once daily morning if we can't parse
     if freq and freq != "unknown":
         logger.warning("Could not parse medication frequency '%s', defaulting to once daily", frequency)
-        return ["08:00"]
+        return ("08:00",)
+
+    return ("08:00",)
+
 
-    return ["08:00"]
+_UNKNOWN_SENTINELS = frozenset({"unknown", "n/a", "none", ""})
 
 
 def _is_unknown(value: Any) -> bool:
     if not value:
         return True
-    return str(value).strip().lower() in ("unknown", "n/a", "none", "")
+    if isinstance(value, str):
+        return value.strip().lower() in _UNKNOWN_SENTINELS
+    return str(value).strip().lower() in _UNKNOWN_SENTINELS
+
+
+# (monitoring flag, rule type, time, message, escalate after minutes, notify)
+_MONITORING_RULES: tuple[tuple[str, str, str, str, int, tuple[str, ...]], ...] = (
+    (
+        "daily_weight_required",
+        "weight",
+        "07:30",
+        "Time to log your weight. Please weigh yourself before eating or drinking.",
+        270,  # 4.5 hours → noon
+        ("caregiver", "nurse"),
+    ),
+    ("bp_required", "bp", "08:30", "Please log your blood pressure reading.", 480, ("caregiver",)),
+    (
+        "symptom_check_required",
+        "symptom_check",
+        "19:00",
+        "Evening check-in: How are you feeling today?",
+        180,
+        ("caregiver",),
+    ),
+)
+
+
+def _expected_dose_count(meds: list[Any]) -> int:
+    """Count the doses per day scheduled across a medication list."""
+    return sum(len(_parse_frequency_to_times(med.get("frequency", ""))) for med in meds if isinstance(med, dict))
+
+
+def _render_rule(rule: dict[str, Any]) -> dict[str, Any]:
+    """Pre-render a rule's notification text for the cron and return the rule."""
+    rule["notification_title"], rule["notification_body"] = render_notification_content(rule)
+    return rule
 
 
 # ---------------------------------------------------------------------------
 # Generate reminder rules from extraction
 # ---------------------------------------------------------------------------
 
-def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict[str, int]:
+def generate_reminder_rules(patient_id: str, extraction: dict[str, Any] | ExtractionView) -> dict[str, int]:
     """Parse extraction JSON and create reminder rules for a patient.
 
     Returns a summary dict with counts of created rules per type.
     """
     counts: dict[str, int] = {}
+    rules: list[dict[str, Any]] = []
+    view = as_view(extraction)
+    monitoring = view.monitoring
 
     # 1. Medication reminders
-    meds = extraction.get("medications", {}).get("discharge_medications", [])
-    for med in meds:
+    for med in view.meds:
         if not isinstance(med, dict):
             continue
         name = med.get("medication_name", "unknown")
@@ -122,7 +180,7 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
 
         rule = {
             "type": "medication",
-            "schedule": {"times": times, "days": "daily"},
+            "schedule": {"times": list(times), "days": "daily"},
             "payload": {
                 "medication_name": name,
                 "dose": med.get("dose", ""),
@@ -133,56 +191,28 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
             "phase": "all",
             "escalation": {"after_minutes": 60, "notify": ["caregiver"]},
         }
-        fdb.add_reminder_rule(patient_id, rule)
+        rules.append(_render_rule(rule))
         counts["medication"] = counts.get("medication", 0) + 1
 
-    # 2. Daily weight monitoring
-    monitoring = (
-        extraction.get("clinical_modules", {})
-        .get("chf", {})
-        .get("monitoring", {})
-    )
-    if monitoring.get("daily_weight_required", True):
-        rule = {
-            "type": "weight",
-            "schedule": {"times": ["07:30"], "days": "daily"},
-            "payload": {
-                "message": "Time to log your weight. Please weigh yourself before eating or drinking.",
-                "target_weight_kg": extraction.get("clinical_modules", {}).get("chf", {}).get("congestion_status", {}).get("target_dry_weight_kg"),
-            },
-            "phase": "all",
-            "escalation": {"after_minutes": 270, "notify": ["caregiver", "nurse"]},  # 4.5 hours → noon
-        }
-        fdb.add_reminder_rule(patient_id, rule)
-        counts["weight"] = 1
-
-    # 3. Blood pressure monitoring
-    if monitoring.get("bp_required", True):
-        rule = {
-            "type": "bp",
-            "schedule": {"times": ["08:30"], "days": "daily"},
-            "payload": {"message": "Please log your blood pressure reading."},
-            "phase": "all",
-            "escalation": {"after_minutes": 480, "notify": ["caregiver"]},
-        }
-        fdb.add_reminder_rule(patient_id, rule)
-        counts["bp"] = 1
-
-    # 4. Symptom check-in (evening)
-    if monitoring.get("symptom_check_required", True):
+    # 2-4. Daily weight, blood pressure and evening symptom check-in
+    for flag, rule_type, time_str, message, after_minutes, notify in _MONITORING_RULES:
+        if not monitoring.get(flag, True):
+            continue
+        payload: dict[str, Any] = {"message": message}
+        if rule_type == "weight":
+            payload["target_weight_kg"] = view.congestion.get("target_dry_weight_kg")
         rule = {
-            "type": "symptom_check",
-            "schedule": {"times": ["19:00"], "days": "daily"},
-            "payload": {"message": "Evening check-in: How are you feeling today?"},
+            "type": rule_type,
+            "schedule": {"times": [time_str], "days": "daily"},
+            "payload": payload,
             "phase": "all",
-            "escalation": {"after_minutes": 180, "notify": ["caregiver"]},
+            "escalation": {"after_minutes": after_minutes, "notify": list(notify)},
         }
-        fdb.add_reminder_rule(patient_id, rule)
-        counts["symptom_check"] = 1
+        rules.append(_render_rule(rule))
+        counts[rule_type] = 1
 
     # 5. Appointment reminders
-    appointments = extraction.get("follow_up", {}).get("appointments", [])
-    for appt in appointments:
+    for appt in view.appointments:
         if not isinstance(appt, dict):
             continue
         scheduled_dt = appt.get("scheduled_datetime")
@@ -190,69 +220,35 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
             continue
 
         try:
-            appt_date = datetime.fromisoformat(scheduled_dt)
+            appt_date = datetime.fromisoformat(scheduled_dt).date()
         except (ValueError, TypeError):
             continue
 
         provider = appt.get("provider_name", "your doctor")
         appt_type = appt.get("appointment_type", "follow-up")
 
-        # Reminder 2 days before
-        reminder_2d = appt_date - timedelta(days=2)
-        rule = {
-            "type": "appointment",
-            "schedule": {
-                "times": ["09:00"],
-                "days": [reminder_2d.strftime("%Y-%m-%d")],
-            },
-            "payload": {
-                "message": f"Reminder: Your {appt_type} appointment with {provider} is in 2 days.",
-                "appointment_datetime": scheduled_dt,
-                "provider": provider,
-            },
-            "phase": "all",
-            "escalation": None,
-        }
-        fdb.add_reminder_rule(patient_id, rule)
-
-        # Reminder 1 day before
-        reminder_1d = appt_date - timedelta(days=1)
-        rule_1d = {
-            "type": "appointment",
-            "schedule": {
-                "times": ["09:00"],
-                "days": [reminder_1d.strftime("%Y-%m-%d")],
-            },
-            "payload": {
-                "message": f"Reminder: Your {appt_type} appointment with {provider} is tomorrow.",
-                "appointment_datetime": scheduled_dt,
-                "provider": provider,
-            },
-            "phase": "all",
-            "escalation": None,
-        }
-        fdb.add_reminder_rule(patient_id, rule_1d)
-
-        # Same-day reminder
-        rule_0d = {
-            "type": "appointment",
-            "schedule": {
-                "times": ["07:00"],
-                "days": [appt_date.strftime("%Y-%m-%d")],
-            },
-            "payload": {
-                "message": f"Today: {appt_type} appointment with {provider}. Please be on time.",
-                "appointment_datetime": scheduled_dt,
-                "provider": provider,
-            },
-            "phase": "all",
-            "escalation": None,
-        }
-        fdb.add_reminder_rule(patient_id, rule_0d)
+        reminders = (
+            ("09:00", appt_date - timedelta(days=2), f"Reminder: Your {appt_type} appointment with {provider} is in 2 days."),
+            ("09:00", appt_date - timedelta(days=1), f"Reminder: Your {appt_type} appointment with {provider} is tomorrow."),
+            ("07:00", appt_date, f"Today: {appt_type} appointment with {provider}. Please be on time."),
+        )
+        for time_str, day, message in reminders:
+            rule = {
+                "type": "appointment",
+                "schedule": {"times": [time_str], "days": [day.isoformat()]},
+                "payload": {
+                    "message": message,
+                    "appointment_datetime": scheduled_dt,
+                    "provider": provider,
+                },
+                "phase": "all",
+                "escalation": None,
+            }
+            rules.append(_render_rule(rule))
         counts["appointment"] = counts.get("appointment", 0) + 3
 
     # 6. Nurse check-in reminders (days 0, 2, 6, then weekly)
-    care_start = extraction.get("care_plan_90d", {}).get("start_date")
+    care_start = view.care_start
     if care_start:
         try:
             start_date = datetime.fromisoformat(care_start)
@@ -261,7 +257,8 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
 
         if start_date:
             checkin_days = [0, 2, 6] + list(range(13, 91, 7))  # day 0,2,6, then every 7 days from day 13
-            checkin_dates = [(start_date + timedelta(days=d)).strftime("%Y-%m-%d") for d in checkin_days]
+            base = start_date.toordinal()
+            checkin_dates = [date.fromordinal(base + d).isoformat() for d in checkin_days]
             rule = {
                 "type": "nurse_checkin",
                 "schedule": {"times": ["10:00"], "days": checkin_dates},
@@ -270,23 +267,20 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
                 "escalation": None,
                 "target": "nurse",  # This reminder goes to the nurse, not the patient
             }
-            fdb.add_reminder_rule(patient_id, rule)
+            rules.append(_render_rule(rule))
             counts["nurse_checkin"] = 1
 
     # 7. Store red flag thresholds on the patient document for escalation checks
-    red_flags = (
-        extraction.get("clinical_modules", {})
-        .get("chf", {})
-        .get("red_flags", {})
-    )
-    fdb.update_patient(patient_id, {
-        "thresholds": {
-            "weight_gain_trigger_24h_kg": red_flags.get("weight_gain_trigger_24h_kg", 1.0),
-            "weight_gain_trigger_7d_kg": red_flags.get("weight_gain_trigger_7d_kg", 2.0),
-            "yellow_zone": red_flags.get("yellow_zone", []),
-            "red_zone": red_flags.get("red_zone", []),
-        },
-    })
+    red_flags = view.red_flags
+    thresholds = {
+        "weight_gain_trigger_24h_kg": red_flags.get("weight_gain_trigger_24h_kg", 1.0),
+        "weight_gain_trigger_7d_kg": red_flags.get("weight_gain_trigger_7d_kg", 2.0),
+        "yellow_zone": red_flags.get("yellow_zone", []),
+        "red_zone": red_flags.get("red_zone", []),
+    }
+
+    # One batched commit for every rule plus the threshold update
+    fdb.batch_add_reminder_rules(patient_id, rules, patient_update={"thresholds": thresholds})
 
     logger.info("Generated reminder rules for patient %s: %s", patient_id, counts)
     return counts
@@ -296,16 +290,12 @@ def generate_reminder_rules(patient_id: str, extraction: dict[str, Any]) -> dict
 # Compute daily compliance
 # ---------------------------------------------------------------------------
 
-def compute_daily_compliance(patient_id: str, date_iso: str, extraction: dict[str, Any]) -> dict[str, Any]:
+def compute_daily_compliance(patient_id: str, date_iso: str, extraction: dict[str, Any] | ExtractionView) -> dict[str, Any]:
     """Compute and store the daily compliance score for a patient."""
+    view = as_view(extraction)
+
     # Count expected medications
-    meds = extraction.get("medications", {}).get("discharge_medications", [])
-    expected_med_count = 0
-    for med in meds:
-        if not isinstance(med, dict):
-            continue
-        times = _parse_frequency_to_times(med.get("frequency", ""))
-        expected_med_count += len(times)
+    expected_med_count = _expected_dose_count(view.meds)
 
     # Count logged medications
     med_logs = fdb.get_medication_logs_for_date(patient_id, date_iso)
@@ -313,9 +303,10 @@ def compute_daily_compliance(patient_id: str, date_iso: str, extraction: dict[st
     skipped_count = sum(1 for m in med_logs if m.get("status") == "skipped")
 
     # Check vital logs
-    weight_logs = fdb.get_vitals_for_date(patient_id, date_iso, "weight")
-    bp_logs = fdb.get_vitals_for_date(patient_id, date_iso, "bp")
-    symptom_logs = fdb.get_vitals_for_date(patient_id, date_iso, "symptom_check")
+    vitals = fdb.get_vitals_by_type_for_date(patient_id, date_iso)
+    weight_logs = vitals.get("weight", [])
+    bp_logs = vitals.get("bp", [])
+    symptom_logs = vitals.get("symptom_check", [])
 
     weight_logged = len(weight_logs) > 0
     bp_logged = len(bp_logs) > 0
@@ -327,7 +318,7 @@ def compute_daily_compliance(patient_id: str, date_iso: str, extraction: dict[st
     score = round(completed_actions / max(expected_actions, 1), 2)
 
     # Determine care plan day and phase
-    care_start = extraction.get("care_plan_90d", {}).get("start_date")
+    care_start = view.care_start
     care_plan_day = 0
     phase = "0-7"
     if care_start:
@@ -10,6 +10,7 @@ from __future__ import annotations
 from typing import Any
 
 from app import firestore_client as fdb
+from app.extraction_view import ExtractionView
 
 
 def init_db() -> None:
@@ -17,7 +18,7 @@ def init_db() -> None:
     pass
 
 
-def save_extraction(extracted: dict[str, Any], simplified_summary: str) -> str:
+def save_extraction(extracted: dict[str, Any] | ExtractionView, simplified_summary: str) -> str:
     """Persist an extraction and return the Firestore document ID (str)."""
     return fdb.save_extraction(extracted, simplified_summary)
 
@@ -2,20 +2,18 @@ from __future__ import annotations
 
 from typing import Any
 
+from app.extraction_view import ExtractionView, as_view
 
-def build_simplified_summary(extracted: dict[str, Any]) -> str:
-    patient = extracted.get("patient", {}) if isinstance(extracted.get("patient"), dict) else {}
-    clinical = extracted.get("clinical_episode", {}) if isinstance(extracted.get("clinical_episode"), dict) else {}
-    encounter = extracted.get("encounter", {}) if isinstance(extracted.get("encounter"), dict) else {}
-    follow = extracted.get("follow_up", {}) if isinstance(extracted.get("follow_up"), dict) else {}
-    meds = extracted.get("medications", {}) if isinstance(extracted.get("medications"), dict) else {}
-    details = extracted.get("extracted_details", {}) if isinstance(extracted.get("extracted_details"), dict) else {}
-    advice = details.get("discharge_advice", {}) if isinstance(details.get("discharge_advice"), dict) else {}
-
-    appointments = follow.get("appointments", []) if isinstance(follow.get("appointments"), list) else []
-    first_appt = appointments[0] if appointments and isinstance(appointments[0], dict) else {}
-    med_rows = meds.get("discharge_medications", []) if isinstance(meds.get("discharge_medications"), list) else []
-    med_count = len(med_rows)
+
+def build_simplified_summary(extracted: dict[str, Any] | ExtractionView) -> str:
+    view = as_view(extracted)
+    patient = view.patient
+    clinical = view.clinical
+    encounter = view.encounter
+    advice = view.discharge_advice
+
+    first_appt = view.first_appointment
+    med_count = len(view.meds)
 
     patient_name = patient.get("full_name") or "Patient"
     dx = clinical.get("primary_diagnosis") or "Not available"
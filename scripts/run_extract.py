@@ -4,22 +4,47 @@ import argparse
 import json
 import sys
 from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional: faster pretty-printed output when installed
+    orjson = None
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from app.pipeline import run_extraction
+from app.pipeline import run_batch_extraction, run_extraction
+
+
+def _dumps(result: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(result, option=orjson.OPT_INDENT_2)
+    return json.dumps(result, indent=2).encode("utf-8")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Extract discharge PDF into structured JSON")
-    parser.add_argument("--pdf", required=True, help="Path to scanned discharge PDF")
-    parser.add_argument("--out", required=True, help="Path to write JSON output")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", help="Path to scanned discharge PDF")
+    source.add_argument("--batch", help="Directory of PDFs to extract with one Gemini Batch Mode job")
+    parser.add_argument("--out", required=True, help="Path to write JSON output (a directory with --batch)")
     parser.add_argument("--ocr-model", default=None, help="Landing.ai parse model")
     parser.add_argument("--json-model", default=None, help="Gemini model for structured extraction step")
     parser.add_argument("--gemini-api-key", default=None, help="Optional Gemini API key override")
     parser.add_argument("--landing-api-key", default=None, help="Optional Landing.ai API key override")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status checks")
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=None,
+        help="Seconds to wait for the batch job before falling back to heuristics (default: GEMINI_BATCH_MAX_WAIT)",
+    )
     args = parser.parse_args()
 
+    if args.batch:
+        _run_batch(args)
+        return
+
     result = run_extraction(
         args.pdf,
         model_ocr=args.ocr_model,
@@ -29,9 +54,38 @@ def main() -> None:
     )
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    out_path.write_bytes(_dumps(result))
     print(f"Wrote extraction JSON to {out_path}")
 
 
+def _run_batch(args: argparse.Namespace) -> None:
+    pdf_paths = sorted(str(p) for p in Path(args.batch).glob("*.pdf"))
+    if not pdf_paths:
+        sys.exit(f"No PDFs found in {args.batch}")
+
+    results = run_batch_extraction(
+        pdf_paths,
+        model_ocr=args.ocr_model,
+        model_json=args.json_model,
+        api_key=args.gemini_api_key,
+        landing_api_key=args.landing_api_key,
+        poll_interval=args.poll_interval,
+        max_wait=args.max_wait,
+    )
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    for pdf_path, result in zip(pdf_paths, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"FAILED {pdf_path}: {result}")
+            continue
+        out_path = out_dir / f"{Path(pdf_path).stem}.json"
+        out_path.write_bytes(_dumps(result))
+    print(f"Wrote {len(pdf_paths) - failed} extraction JSON file(s) to {out_dir}")
+    if failed:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()